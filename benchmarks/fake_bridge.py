@@ -0,0 +1,262 @@
+"""Stand-in for the Colab frontend used by the benchmarks
+
+FakeBridge answers the Javascript calls made by colab_utils (webcam frames, audio recordings,
+imshow updates, labelImage...) from Python, sleeping `latency` seconds for each round trip
+(eval_js calls that wait for a result) and len(result)/bandwidth seconds for the transfer.
+
+  from colab_utils import set_bridge
+  bridge = FakeBridge(latency=0.01)
+  previous = set_bridge(bridge)
+  frame = webcam2numpy()
+"""
+
+from io import BytesIO
+from base64 import b64encode
+from time import sleep, perf_counter
+import json
+import re
+
+from PIL import Image
+import numpy as np
+
+from colab_utils import Bridge
+
+
+class FakeHandle:
+  """Minimal IPython DisplayHandle"""
+  def __init__(self, display_id):
+    self.display_id = display_id
+
+  def update(self, obj):
+    pass
+
+
+class FakeBridge(Bridge):
+  """Answers colab_utils' Javascript calls with synthetic data
+
+  latency: seconds per round trip (eval_js waiting for a result)
+  bandwidth: bytes/s from the browser to Python (None means infinite)
+  camera_size: (width, height) used when the frames are not resized by the browser
+  n_frames: number of different (pre-encoded) frames the fake camera cycles through
+  audio: bytes of a recording (e.g. webm/opus) returned to getAudio
+  audio_mime: mime type of audio
+  audio_seconds: length of the stream produced for getAudioStream
+  boxes: what labelImage receives from the "user"
+  scene_every: the scene seen by the camera changes every scene_every frames of a stream, the frames
+    in between are identical and skipped when videoGrabber(change_threshold=...) is used
+  """
+
+  def __init__(self, latency=0.01, bandwidth=None, camera_size=(640, 480), n_frames=8,
+               audio=None, audio_mime='audio/webm', audio_seconds=5.0, sample_rate=48000, boxes=None,
+               scene_every=1):
+    self.scene_every = scene_every
+    self.latency = latency
+    self.bandwidth = bandwidth
+    self.camera_size = camera_size
+    self.n_frames = n_frames
+    self.audio = audio
+    self.audio_mime = audio_mime
+    self.audio_seconds = audio_seconds
+    self.sample_rate = sample_rate
+    self.boxes = boxes if boxes is not None else [[[10, 10, 100, 100], "cat"]]
+    self.cell = 1
+    self.reset_stats()
+    self._frames = {}
+    self._encode_time = {} # ms per frame (reported as the browser's encode time)
+    self._encode_ms = 0
+    self._frame_count = 0
+    self._mode = None
+    self._cfg = None
+    self._change = None
+    self._stream = None
+    self._audio_stream = None
+
+  def reset_stats(self):
+    self.round_trips = 0
+    self.bytes_received = 0 # browser -> Python
+    self.bytes_sent = 0 # Python -> browser
+    self.shown = 0 # images received by imshow windows
+
+  def execution_count(self):
+    return self.cell
+
+  def display_html(self, src, display_id=None):
+    self.bytes_sent += len(src)
+    if 'frame_cfg' in src:
+      self._mode = 'video'
+      self._cfg = self._parse_frame_cfg(src)
+      self._change = self._parse_change_cfg(src)
+      self._stream = None
+    elif 'getUserMedia({audio: true})' in src:
+      self._mode = 'audio_stream' if 'AudioWorklet' in src else 'audio'
+    return FakeHandle(display_id) if display_id is not None else None
+
+  def display_js(self, src):
+    self.bytes_sent += len(src)
+
+  def eval_js(self, script, ignore_result=False):
+    self.bytes_sent += len(script)
+    result = self._dispatch(script)
+    if ignore_result:
+      return None
+    size = len(result) if isinstance(result, str) else len(json.dumps(result))
+    self.round_trips += 1
+    self.bytes_received += size
+    sleep(self.latency + (size/self.bandwidth if self.bandwidth else 0))
+    return result
+
+  def _dispatch(self, script):
+    name, args = re.match(r"\s*(\w+)(?:\((.*)\))?", script, re.S).groups()
+    if name == 'data':
+      return self._audio_dataurl() if self._mode == 'audio' else self._frame()
+    if name == 'getData':
+      ms, *timing = args.split(',')
+      sleep(float(ms)/1000)
+      return [self._frame(), float(ms), self._encode_ms] if timing else self._frame()
+    if name == 'startStream':
+      fps, buffer_size = args.split(',')
+      self._stream = {'period': 1/float(fps), 'buffer_size': int(buffer_size), 'next': perf_counter(), 'index': 0,
+                      'buffer': [], 'dropped': 0, 'skipped': 0, 'last_scene': None, 'last_time': 0}
+      return None
+    if name == 'getFrames':
+      n, timeout = [int(v) for v in args.split(',')]
+      return self._get_frames(n, timeout/1000)
+    if name == 'stopVideo':
+      self._stream = None
+      return None
+    if name == 'colab_utils_imwrite':
+      self.shown += 1
+      return None
+    if name == 'label_image':
+      return self.boxes
+    if name == 'startAudio':
+      self._audio_stream = {'block': round(self.sample_rate*int(args)/1000), 'sent': 0}
+      return None
+    if name == 'getAudioChunks':
+      return self._get_audio_chunks()
+    return None
+
+  def _parse_change_cfg(self, src):
+    """(threshold, keepalive in seconds) or None when the change detector is off"""
+    cfg = re.search(r"change_cfg = \{threshold: ([\w.]+), keepalive: ([\w.]+)", src)
+    if cfg is None or cfg.group(1) == 'null':
+      return None
+    keepalive = cfg.group(2)
+    return (float(cfg.group(1)), None if keepalive == 'null' else float(keepalive)/1000)
+
+  def _parse_frame_cfg(self, src):
+    cfg = re.search(r"frame_cfg = \{transport: '(\w+)', quality: ([\d.]+), gray: (\w+), width: (\d+), height: (\d+), "
+                    r"fit: '(\w+)', bgr: (\w+)\}", src)
+    transport, quality, gray, w, h, fit, bgr = cfg.groups()
+    video = re.search(r"width=(\d+) height=(\d+)></video>", src)
+    size = (int(w), int(h)) if int(w) > 0 else (tuple(int(v) for v in video.groups()) if video else self.camera_size)
+    return (transport, float(quality), gray == 'true', size, bgr == 'true')
+
+  def _frame(self, scene=None):
+    frames = self.camera_frames(*(self._cfg or ('jpeg', 0.8, False, self.camera_size, False)))
+    if scene is None:
+      self._frame_count += 1
+      scene = self._frame_count
+    return frames[scene % len(frames)]
+
+  def camera_frames(self, transport='jpeg', quality=0.8, gray=False, size=None, bgr=False):
+    """Encoded frames sent by the fake camera (encoded only once, so benchmarks can call it beforehand)"""
+    cfg = (transport, quality, gray, tuple(size or self.camera_size), bgr)
+    if cfg not in self._frames:
+      start = perf_counter()
+      self._frames[cfg] = [encode_frame(frame, transport, quality, gray, bgr)
+                           for frame in synthetic_frames(cfg[3], self.n_frames)]
+      self._encode_time[cfg] = (perf_counter() - start)*1000/self.n_frames
+    self._encode_ms = self._encode_time[cfg]
+    return self._frames[cfg]
+
+  def _get_frames(self, n, timeout):
+    stream = self._stream
+    start = perf_counter()
+    if stream is None:
+      return {'frames': [], 'dropped': 0, 'skipped': 0, 'waited': 0, 'now': round(1000*start)}
+    deadline = start + timeout
+    while True:
+      self._capture(stream, perf_counter())
+      if stream['buffer'] or perf_counter() >= deadline:
+        break
+      sleep(max(0, min(stream['next'], deadline) - perf_counter()))
+    now = perf_counter()
+    frames = [[round(1000*t), self._frame(scene), self._encode_ms] for t, scene in stream['buffer'][:n]]
+    del stream['buffer'][:n]
+    result = {'frames': frames, 'dropped': stream['dropped'], 'skipped': stream['skipped'],
+              'waited': 1000*(now - start), 'now': round(1000*now)}
+    stream['dropped'] = stream['skipped'] = 0
+    return result
+
+  def _capture(self, stream, now):
+    """Runs the browser's capture timer (startStream) until now"""
+    while stream['next'] <= now:
+      t = stream['next']
+      scene = stream['index']//self.scene_every
+      stream['next'] += stream['period']
+      stream['index'] += 1
+      if self._change is not None:
+        _, keepalive = self._change
+        if scene == stream['last_scene'] and (keepalive is None or t - stream['last_time'] < keepalive):
+          stream['skipped'] += 1
+          continue
+        stream['last_scene'], stream['last_time'] = scene, t
+      stream['buffer'].append((t, scene))
+      if len(stream['buffer']) > stream['buffer_size']:
+        stream['buffer'].pop(0)
+        stream['dropped'] += 1
+
+  def _audio_dataurl(self):
+    if self.audio is None:
+      raise RuntimeError("FakeBridge needs an audio recording (audio=bytes) for getAudio")
+    return "data:%s;base64,%s" % (self.audio_mime, b64encode(self.audio).decode("ascii"))
+
+  def _get_audio_chunks(self):
+    stream = self._audio_stream
+    total = round(self.audio_seconds*self.sample_rate)
+    block = min(stream['block'], total - stream['sent'])
+    t = (stream['sent'] + np.arange(block))/self.sample_rate
+    stream['sent'] += block
+    chunk = (0.1*np.sin(2*np.pi*440*t)).astype(np.float32)
+    return {'chunks': [b64encode(chunk.tobytes()).decode("ascii")] if block else [],
+            'done': stream['sent'] >= total, 'sr': self.sample_rate}
+
+
+def synthetic_frames(size, n, seed=0):
+  """n RGB frames (H,W,3 uint8): a gradient with a moving square and some sensor noise"""
+  w, h = size
+  rnd = np.random.RandomState(seed)
+  x = np.linspace(0, 255, w, dtype=np.float32)
+  y = np.linspace(0, 255, h, dtype=np.float32)[:, None]
+  background = np.stack(np.broadcast_arrays(x + 0*y, y + 0*x, (x+y)/2), axis=-1)
+  frames = []
+  for i in range(n):
+    frame = background + rnd.normal(0, 8, background.shape)
+    s = max(1, min(w, h)//4)
+    x0, y0 = (i*w//n) % (w-s+1), (i*h//n) % (h-s+1)
+    frame[y0:y0+s, x0:x0+s] = (255, 64, 32)
+    frames.append(np.clip(frame, 0, 255).astype(np.uint8))
+  return frames
+
+
+def encode_frame(frame, transport='jpeg', quality=0.8, gray=False, bgr=False):
+  """Same output as encodeFrame (capture.FRAME_JS) in the browser (the fit is not simulated)"""
+  h, w = frame.shape[:2]
+  if transport == 'raw':
+    if bgr and not gray:
+      frame = np.ascontiguousarray(frame[..., ::-1])
+    if gray:
+      rgb = frame.astype(np.uint16)
+      frame = ((77*rgb[..., 0] + 150*rgb[..., 1] + 29*rgb[..., 2]) >> 8).astype(np.uint8)
+    c = 1 if gray else 3
+    return "raw:%d,%d,%d;%s" % (w, h, c, b64encode(frame.tobytes()).decode("ascii"))
+  img = Image.fromarray(frame)
+  if gray:
+    img = img.convert('L').convert('RGB')
+  buffer = BytesIO()
+  if transport == 'png':
+    img.save(buffer, format='PNG')
+  else:
+    img.save(buffer, format=transport.upper(), quality=round(quality*100))
+  return "data:image/%s;base64,%s" % (transport, b64encode(buffer.getvalue()).decode("ascii"))
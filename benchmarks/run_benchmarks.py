@@ -0,0 +1,521 @@
+"""colab_utils benchmarks
+
+Runs outside Colab: the browser is replaced by benchmarks/fake_bridge.FakeBridge (synthetic frames,
+a recorded audio blob and a simulated round-trip latency) and the images downloaded by saveimgslocally
+are served by a local HTTP server.
+
+  python benchmarks/run_benchmarks.py                          # everything
+  python benchmarks/run_benchmarks.py capture display          # only some groups
+  python benchmarks/run_benchmarks.py import                   # import time (fails if PIL, scipy... get imported)
+  python benchmarks/run_benchmarks.py --latency 30 --save base.json
+  python benchmarks/run_benchmarks.py --compare base.json      # exits with 1 when something got slower
+
+For each benchmark it reports the throughput, the latency percentiles (per frame / call) and the peak
+memory allocated by Python and numpy (measured by tracemalloc in a second run, so it doesn't slow down
+the timed one; buffers allocated by PIL are not included).
+"""
+
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import tracemalloc
+from contextlib import redirect_stdout
+from io import StringIO
+from itertools import count
+from os.path import abspath, dirname, join
+from tempfile import TemporaryDirectory
+from threading import Thread
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from time import perf_counter, sleep
+
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PIL import Image
+import numpy as np
+
+import colab_utils
+from fake_bridge import FakeBridge, synthetic_frames
+
+
+BENCHMARKS = []
+
+def benchmark(group, unit):
+  """Registers func(args) -> work, where work() runs the measured part and returns (count, latencies)"""
+  def register(func):
+    BENCHMARKS.append((group, func.__name__, unit, func))
+    return func
+  return register
+
+
+def measure(work, memory=True):
+  t = perf_counter()
+  count, latencies = work()
+  seconds = perf_counter() - t
+  peak = None
+  if memory:
+    tracemalloc.start()
+    work()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+  return count, seconds, latencies, peak
+
+
+def timed_calls(func, n):
+  latencies = []
+  for i in range(n):
+    t = perf_counter()
+    func(i)
+    latencies.append(perf_counter() - t)
+  return n, latencies
+
+
+# Import
+
+# modules colab_utils must not import until a function needing them is called
+HEAVY_MODULES = ('PIL', 'requests', 'scipy', 'ffmpeg', 'IPython', 'google.colab')
+
+_IMPORT_SCRIPT = """
+import json, sys
+sys.path.insert(0, %r)
+from time import perf_counter
+t = perf_counter()
+%s
+seconds = perf_counter() - t
+print(json.dumps([seconds, [m for m in %r if m in sys.modules]]))
+"""
+
+def _import(args, statement):
+  """Times statement in fresh interpreters (isolated: PYTHONPATH is ignored), failing when it imports
+  any of HEAVY_MODULES. The latencies are the import times, the rate includes the interpreter start up."""
+  script = _IMPORT_SCRIPT % (ROOT, statement, HEAVY_MODULES)
+  def work():
+    latencies = []
+    for i in range(args.imports):
+      out = subprocess.run([sys.executable, "-I", "-c", script], capture_output=True, text=True, check=True)
+      seconds, loaded = json.loads(out.stdout)
+      if loaded:
+        raise AssertionError(f"{statement!r} imported {', '.join(loaded)}")
+      latencies.append(float(seconds))
+    return args.imports, latencies
+  return work
+
+
+@benchmark('import', 'imports/s')
+def import_colab_utils(args):
+  return _import(args, "import colab_utils")
+
+
+@benchmark('import', 'imports/s')
+def import_splitdataset(args):
+  return _import(args, "from colab_utils import splitdataset")
+
+
+# Capture
+
+@benchmark('capture', 'frames/s')
+def webcam2numpy_jpeg(args):
+  args.bridge.camera_frames('jpeg')
+  return lambda: timed_calls(lambda i: colab_utils.webcam2numpy(size=(640, 480)), args.frames)
+
+
+@benchmark('capture', 'frames/s')
+def webcam2numpy_raw(args):
+  args.bridge.camera_frames('raw')
+  return lambda: timed_calls(lambda i: colab_utils.webcam2numpy(size=(640, 480), transport='raw'), args.frames)
+
+
+@benchmark('capture', 'frames/s')
+def videoGrabber_call_jpeg(args):
+  args.bridge.camera_frames('jpeg')
+  def work():
+    vid = colab_utils.videoGrabber(size=(640, 480))
+    result = timed_calls(lambda i: vid(ms=0), args.frames)
+    vid.stop()
+    return result
+  return work
+
+
+def _stream(args, **kwargs):
+  """Frames pulled from a fake camera running at args.fps. The latency is the age of each frame
+  (capture -> numpy), valid here because FakeBridge timestamps the frames with Python's clock."""
+  args.bridge.camera_frames(kwargs.get('transport', 'jpeg'), size=kwargs.get('out_size'),
+                            bgr=kwargs.get('transport') == 'raw' and kwargs.get('channel_order') == 'BGR')
+  def work():
+    vid = colab_utils.videoGrabber(size=(640, 480), fps=args.fps, **kwargs)
+    ages = []
+    while len(ages) < args.frames:
+      for frame, timestamp in vid.read(n=4):
+        ages.append(perf_counter() - timestamp)
+    vid.stop()
+    return len(ages), ages
+  return work
+
+
+@benchmark('capture', 'frames/s')
+def videoGrabber_read_jpeg(args):
+  return _stream(args)
+
+
+@benchmark('capture', 'frames/s')
+def videoGrabber_read_raw(args):
+  return _stream(args, transport='raw')
+
+
+@benchmark('capture', 'frames/s')
+def videoGrabber_read_model(args):
+  """320x320 float32 BGR frames in -1..1 (cropped and packed by the browser)"""
+  return _stream(args, transport='raw', out_size=(320, 320), fit='crop', channel_order='BGR',
+                 dtype='float32', value_range=(-1, 1))
+
+
+@benchmark('capture', 'frames/s')
+def videoGrabber_read_stats(args):
+  return _stream(args, stats=colab_utils.TimingStats())
+
+
+# Capture -> model -> display loop
+
+def _fake_model(args):
+  """Stands for an inference taking args.model_ms (sleeping, so it releases the GIL like most frameworks)"""
+  def model(frame):
+    sleep(args.model_ms/1000)
+    return frame
+  return model
+
+
+@benchmark('loop', 'frames/s')
+def loop_sequential(args):
+  args.bridge.camera_frames('jpeg')
+  model = _fake_model(args)
+  def work():
+    vid = colab_utils.videoGrabber(size=(640, 480), fps=args.fps)
+    latencies = []
+    start = perf_counter()
+    for i, (frame, timestamp) in enumerate(vid.frames(n=4)):
+      colab_utils.imshow(model(frame), windowName="bench_loop")
+      latencies.append(perf_counter() - start)
+      start = perf_counter()
+      if i + 1 == args.frames:
+        vid.stop()
+    return len(latencies), latencies
+  return work
+
+
+@benchmark('loop', 'frames/s')
+def loop_pipeline(args):
+  args.bridge.camera_frames('jpeg')
+  model = _fake_model(args)
+  def work():
+    vid = colab_utils.videoGrabber(size=(640, 480), fps=args.fps)
+    n = asyncio.run(colab_utils.run_pipeline(vid, model, colab_utils.ImageWindow("bench_pipeline"), max_frames=args.frames))
+    vid.stop()
+    return n, None
+  return work
+
+
+# Display
+
+@benchmark('display', 'frames/s')
+def imshow_array(args):
+  frames = synthetic_frames((640, 480), 8)
+  return lambda: timed_calls(lambda i: colab_utils.imshow(frames[i % len(frames)], windowName="bench"), args.frames)
+
+
+@benchmark('display', 'frames/s')
+def imshow_array_overlay(args):
+  frames = synthetic_frames((640, 480), 8)
+  stats = colab_utils.TimingStats()
+  show = lambda i: colab_utils.imshow(frames[i % len(frames)], windowName="bench_overlay", stats=stats, overlay=True)
+  return lambda: timed_calls(show, args.frames)
+
+
+@benchmark('display', 'frames/s')
+def imshow_unchanged(args):
+  frame = synthetic_frames((640, 480), 1)[0]
+  return lambda: timed_calls(lambda i: colab_utils.imshow(frame, windowName="bench_unchanged"), args.frames)
+
+
+@benchmark('display', 'frames/s')
+def imshow_file(args):
+  tmp = args.tmp
+  filenames = []
+  for i, frame in enumerate(synthetic_frames((640, 480), 8)):
+    filenames.append(join(tmp, f"imshow_{i}.jpg"))
+    Image.fromarray(frame).save(filenames[-1], quality=80)
+  return lambda: timed_calls(lambda i: colab_utils.imshow(filenames[i % len(filenames)], windowName="bench_file"), args.frames)
+
+
+@benchmark('display', 'images/s')
+def labelImage(args):
+  frame = synthetic_frames((640, 480), 1)[0]
+  return lambda: timed_calls(lambda i: colab_utils.labelImage(frame), max(1, args.frames//5))
+
+
+# Audio
+
+def _recording(seconds):
+  """webm/opus blob like the one recorded by the browser (None without ffmpeg)"""
+  try:
+    import ffmpeg
+  except ImportError:
+    return None
+  try:
+    out, _ = (ffmpeg
+      .input(f'sine=frequency=440:duration={seconds}', f='lavfi')
+      .output('pipe:1', format='webm', acodec='libopus')
+      .run(capture_stdout=True, quiet=True)
+    )
+    return out
+  except (OSError, ffmpeg.Error):
+    return None
+
+
+def _get_audio(args, **kwargs):
+  if args.bridge.audio is None:
+    return None
+  def work():
+    n, latencies = timed_calls(lambda i: colab_utils.getAudio(**kwargs), args.recordings)
+    return n*args.audio_seconds, latencies
+  return work
+
+
+@benchmark('audio', 'audio s/s')
+def getAudio_wav(args):
+  return _get_audio(args)
+
+
+@benchmark('audio', 'audio s/s')
+def getAudio_pcm(args):
+  if args.bridge.audio is None:
+    return None
+  decoder = colab_utils.PCMDecoder()
+  args.cleanup.append(decoder.close)
+  return _get_audio(args, decoder=decoder)
+
+
+@benchmark('audio', 'audio s/s')
+def getAudioStream(args):
+  def work():
+    latencies = []
+    samples = 0
+    t = perf_counter()
+    for block, sr in colab_utils.getAudioStream(block_ms=250):
+      latencies.append(perf_counter() - t)
+      samples += len(block)
+      t = perf_counter()
+    return samples/args.bridge.sample_rate, latencies
+  return work
+
+
+# Datasets
+
+def _dataset_rows(n, paths, labels=('cat', 'dog', 'bird', 'rare')):
+  rnd = np.random.RandomState(0)
+  rows = []
+  for i in range(n):
+    x, y = rnd.uniform(0, 0.5, 2).round(3)
+    rows.append(f"UNASSIGNED,{paths[i % len(paths)]},{labels[rnd.randint(len(labels))]},{x},{y},,,{x+0.4},{y+0.4},,")
+  return rows
+
+
+def _images(args, prefix, n_boxes=2):
+  """Saves args.images JPEGs (320x240) and returns the CSV rows (n_boxes per image) with paths prefix + file name"""
+  paths = []
+  for i, frame in enumerate(synthetic_frames((320, 240), args.images)):
+    Image.fromarray(frame).save(join(args.tmp, f"img_{i}.jpg"), quality=90)
+    paths.append(f"{prefix}img_{i}.jpg")
+  return _dataset_rows(n_boxes*len(paths), paths)
+
+
+def _write_csv(filename, rows):
+  with open(filename, 'w') as file:
+    file.write("\n".join(rows) + "\n")
+
+
+@benchmark('dataset', 'rows/s')
+def splitdataset(args, stratify=False):
+  csvfilename = join(args.tmp, "split.csv")
+  rows = _dataset_rows(args.rows, [f"gs://bucket/img{i}.jpg" for i in range(args.rows//2)])
+  _write_csv(csvfilename, rows)
+  def work():
+    colab_utils.splitdataset(csvfilename, newcsvfilename=csvfilename + ".out", stratify=stratify)
+    return len(rows), None
+  return work
+
+
+@benchmark('dataset', 'rows/s')
+def splitdataset_stratified(args):
+  return splitdataset(args, stratify=True)
+
+
+@benchmark('dataset', 'rows/s')
+def cocojson2modelmakercsv(args):
+  n_images = args.rows//2
+  coco = {
+    "images": [{"id": i+1, "file_name": f"img{i}.jpg", "width": 640, "height": 480} for i in range(n_images)],
+    "categories": [{"id": i+1, "name": name} for i, name in enumerate(('cat', 'dog', 'bird'))],
+    "annotations": [{"id": i+1, "image_id": i % n_images + 1, "category_id": i % 3 + 1, "bbox": [10, 20, 100, 50]}
+                    for i in range(args.rows)],
+  }
+  cocojsonfilename = join(args.tmp, "coco.json")
+  with open(cocojsonfilename, 'w') as file:
+    json.dump(coco, file)
+  def work():
+    colab_utils.cocojson2modelmakercsv(cocojsonfilename, join(args.tmp, "coco.csv"), img_dir="imgs")
+    return args.rows, None
+  return work
+
+
+@benchmark('dataset', 'rows/s')
+def augment_dataset(args):
+  rows = _images(args, join(args.tmp, ""))
+  csvfilename = join(args.tmp, "augment.csv")
+  _write_csv(csvfilename, rows)
+  def work():
+    _write_csv(csvfilename + ".work", rows)
+    colab_utils.augment_dataset(csvfilename + ".work")
+    return len(rows), None
+  return work
+
+
+@benchmark('dataset', 'images/s')
+def augment_generator(args):
+  csvfilename = join(args.tmp, "generator.csv")
+  _write_csv(csvfilename, _images(args, join(args.tmp, "")))
+  def work():
+    n = 0
+    for images, boxes, labels in colab_utils.augment_generator(csvfilename, batch_size=16):
+      n += len(images)
+    return n, None
+  return work
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+  def log_message(self, *args):
+    pass
+
+
+@benchmark('dataset', 'rows/s')
+def saveimgslocally(args):
+  server = ThreadingHTTPServer(('127.0.0.1', 0), partial(_QuietHandler, directory=args.tmp))
+  Thread(target=server.serve_forever, daemon=True).start()
+  args.cleanup.append(server.shutdown)
+  url = "http://127.0.0.1:%d/" % server.server_address[1]
+  rows = _images(args, url)
+  csvfilename = join(args.tmp, "download.csv")
+  _write_csv(csvfilename, rows)
+  runs = count()
+  def work():
+    img_path = join(args.tmp, f"downloaded_{next(runs)}") # already downloaded images are skipped
+    colab_utils.saveimgslocally(csvfilename, csvfilename + ".out", img_path=img_path)
+    return len(rows), None
+  return work
+
+
+def run(args):
+  results = {}
+  args.bridge = FakeBridge(latency=args.latency/1000,
+                           bandwidth=args.bandwidth*1e6 if args.bandwidth else None,
+                           audio_seconds=args.audio_seconds)
+  previous = colab_utils.set_bridge(args.bridge)
+  try:
+    if not args.groups or 'audio' in args.groups:
+      args.bridge.audio = _recording(args.audio_seconds)
+      if args.bridge.audio is None:
+        print("ffmpeg not found: skipping getAudio", file=sys.stderr)
+    for group, name, unit, func in BENCHMARKS:
+      if args.groups and group not in args.groups:
+        continue
+      with TemporaryDirectory() as tmp:
+        args.tmp = tmp
+        args.cleanup = []
+        try:
+          work = func(args)
+          if work is not None:
+            with redirect_stdout(StringIO()):
+              n, seconds, latencies, peak = measure(work, not args.no_memory)
+            results[name] = summary(group, unit, n, seconds, latencies, peak)
+            print(format_result(name, results[name]), flush=True)
+        finally:
+          for cleanup in args.cleanup:
+            cleanup()
+  finally:
+    colab_utils.set_bridge(previous)
+  return results
+
+
+def summary(group, unit, count, seconds, latencies, peak):
+  result = {'group': group, 'unit': unit, 'rate': count/seconds}
+  if latencies:
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])*1000
+    result.update(p50_ms=p50, p90_ms=p90, p99_ms=p99)
+  if peak is not None:
+    result['peak_mb'] = peak/2**20
+  return result
+
+
+def format_result(name, r):
+  line = f"{r['group']:8s} {name:26s} {r['rate']:12.1f} {r['unit']:10s}"
+  if 'p50_ms' in r:
+    line += f" p50 {r['p50_ms']:8.2f} ms  p90 {r['p90_ms']:8.2f} ms  p99 {r['p99_ms']:8.2f} ms"
+  if 'peak_mb' in r:
+    line += f"  peak {r['peak_mb']:7.1f} MB"
+  return line
+
+
+def compare(results, baseline, tolerance):
+  """Prints the throughput ratio against baseline and returns the names that got slower than tolerance"""
+  slower = []
+  for name, r in results.items():
+    if name not in baseline:
+      continue
+    ratio = r['rate']/baseline[name]['rate']
+    flag = ""
+    if ratio < 1 - tolerance:
+      slower.append(name)
+      flag = "  <-- SLOWER"
+    print(f"{name:26s} {ratio:6.2f}x{flag}")
+  return slower
+
+
+def main(argv=None):
+  groups = sorted({group for group, *_ in BENCHMARKS})
+  parser = argparse.ArgumentParser(description="colab_utils benchmarks (no browser needed)")
+  parser.add_argument('groups', nargs='*', help=f"benchmark groups: {', '.join(groups)} (default: all)")
+  parser.add_argument('--latency', type=float, default=10, help="simulated round trip to the browser in ms")
+  parser.add_argument('--bandwidth', type=float, default=None, help="browser -> Python bandwidth in MB/s")
+  parser.add_argument('--frames', type=int, default=60, help="frames per capture / display benchmark")
+  parser.add_argument('--fps', type=float, default=120, help="fake camera frame rate for videoGrabber.read")
+  parser.add_argument('--model-ms', type=float, default=15, help="inference time of the fake model in the loop benchmarks")
+  parser.add_argument('--recordings', type=int, default=3, help="recordings per getAudio benchmark")
+  parser.add_argument('--audio-seconds', type=float, default=5, help="length of each recording")
+  parser.add_argument('--rows', type=int, default=20000, help="rows for splitdataset / cocojson2modelmakercsv")
+  parser.add_argument('--images', type=int, default=32, help="images for augment_* / saveimgslocally")
+  parser.add_argument('--imports', type=int, default=10, help="fresh interpreters per import benchmark")
+  parser.add_argument('--no-memory', action='store_true', help="skip the (second) run measuring memory")
+  parser.add_argument('--save', help="saves the results as JSON")
+  parser.add_argument('--compare', help="JSON saved by --save to compare against")
+  parser.add_argument('--tolerance', type=float, default=0.2, help="accepted slowdown (fraction) for --compare")
+  args = parser.parse_args(argv)
+  unknown = set(args.groups) - set(groups)
+  if unknown:
+    parser.error(f"unknown groups {sorted(unknown)}, choose from {groups}")
+
+  results = run(args)
+  if args.save:
+    with open(args.save, 'w') as file:
+      json.dump(results, file, indent=2)
+  if args.compare:
+    with open(args.compare) as file:
+      baseline = json.load(file)
+    if compare(results, baseline, args.tolerance):
+      return 1
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,94 @@
+"""Python <-> browser bridge
+
+Everything colab_utils sends to (or receives from) the notebook frontend goes through a Bridge.
+The default one uses google.colab.output.eval_js and IPython.display, imported only when first used,
+so the rest of the package can be imported (and tested) outside of Colab. Other frontends (or a fake
+for benchmarks) can be plugged in with set_bridge:
+
+  class MyBridge(Bridge):
+    def eval_js(self, script, ignore_result=False):
+      ...
+
+  previous = set_bridge(MyBridge())
+
+The async API (VideoGrabber.aframes, ImageWindow.ashow, run_pipeline...) sends all its bridge calls
+through run_in_bridge, a single background thread, so they never overlap (eval_js is not thread-safe).
+"""
+
+from functools import partial
+
+
+class Bridge:
+  """Default bridge: Google Colab's eval_js + IPython.display"""
+
+  def eval_js(self, script, ignore_result=False):
+    """Runs script in the browser and returns its (awaited) result"""
+    from google.colab.output import eval_js
+    return eval_js(script, ignore_result=ignore_result)
+
+  def display_html(self, src, display_id=None):
+    """Displays src as HTML in the output cell and returns the display handle (if display_id)"""
+    from IPython.display import display, HTML
+    if display_id is None:
+      return display(HTML(src))
+    return display(HTML(src), display_id=display_id)
+
+  def display_js(self, src):
+    """Runs src as Javascript in the output cell without waiting for a result"""
+    from IPython.display import display, Javascript
+    display(Javascript(src))
+
+  def execution_count(self):
+    """Current cell execution count (0 when not running inside IPython)"""
+    from IPython import get_ipython
+    ipython = get_ipython()
+    return ipython.execution_count if ipython is not None else 0
+
+
+_bridge = Bridge()
+
+
+def get_bridge():
+  return _bridge
+
+
+def set_bridge(bridge):
+  """Replaces the bridge used by colab_utils and returns the previous one"""
+  global _bridge
+  previous, _bridge = _bridge, bridge
+  return previous
+
+
+def eval_js(script, ignore_result=False):
+  return _bridge.eval_js(script, ignore_result=ignore_result)
+
+
+def display_html(src, display_id=None):
+  return _bridge.display_html(src, display_id=display_id)
+
+
+def display_js(src):
+  _bridge.display_js(src)
+
+
+def execution_count():
+  return _bridge.execution_count()
+
+
+_executor = None
+
+
+def bridge_executor():
+  """Single thread running the blocking bridge calls made by the async API"""
+  global _executor
+  if _executor is None:
+    from concurrent.futures import ThreadPoolExecutor
+    _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="colab_utils_bridge")
+  return _executor
+
+
+async def run_in_bridge(func, *args, **kwargs):
+  """Awaits func(*args, **kwargs) running in the bridge thread, leaving the event loop free meanwhile"""
+  import asyncio
+  loop = asyncio.get_running_loop()
+  return await loop.run_in_executor(bridge_executor(), partial(func, *args, **kwargs))
@@ -0,0 +1,350 @@
+"""Microphone recording (getAudio) and streaming (getAudioStream)
+
+ffmpeg (ffmpeg-python) and scipy are only imported when a recording needs to be decoded.
+"""
+
+from io import BytesIO
+from base64 import b64decode
+from threading import Lock, Thread
+import subprocess
+
+import numpy as np
+
+from ._bridge import eval_js, display_html
+
+
+def getAudio(pcm_format=None, sample_rate=48000, channels=1, decoder=None):
+  """Records audio from your local microphone inside a colab notebook
+
+  By default the recording is converted to WAV by ffmpeg. With pcm_format ('f32le', 's16le', ...)
+  or a PCMDecoder (decoder), it's decoded straight to raw PCM with the requested sample_rate and
+  channels instead, skipping the WAV header and the extra parsing. Passing the same decoder to
+  several calls also avoids waiting for a new ffmpeg process each time.
+
+  Returns
+  -------
+  tuple
+    audio (numpy.ndarray), sample rate (int)
+
+  Obs:
+  To write this piece of code I took inspiration/code from a lot of places.
+  It was late night, so I'm not sure how much I created or just copied o.O
+  Here are some of the possible references:
+  https://blog.addpipe.com/recording-audio-in-the-browser-using-pure-html5-and-minimal-javascript/
+  https://stackoverflow.com/a/18650249
+  https://hacks.mozilla.org/2014/06/easy-audio-capture-with-the-mediarecorder-api/
+  https://air.ghost.io/recording-to-an-audio-file-using-html5-and-js/
+  https://stackoverflow.com/a/49019356
+  """
+
+  AUDIO_HTML = """
+  <script>
+  var my_div = document.createElement("DIV");
+  var my_p = document.createElement("P");
+  var my_btn = document.createElement("BUTTON");
+  var t = document.createTextNode("Press to start recording");
+
+  my_btn.appendChild(t);
+  //my_p.appendChild(my_btn);
+  my_div.appendChild(my_btn);
+  document.body.appendChild(my_div);
+
+  var base64data = 0;
+  var reader;
+  var recorder, gumStream;
+  var recordButton = my_btn;
+
+  var handleSuccess = function(stream) {
+    gumStream = stream;
+    var options = {
+      //bitsPerSecond: 8000, //chrome seems to ignore, always 48k
+      mimeType : 'audio/webm;codecs=opus'
+      //mimeType : 'audio/webm;codecs=pcm'
+    };            
+    //recorder = new MediaRecorder(stream, options);
+    recorder = new MediaRecorder(stream);
+    recorder.ondataavailable = function(e) {            
+      var url = URL.createObjectURL(e.data);
+      var preview = document.createElement('audio');
+      preview.controls = true;
+      preview.src = url;
+      document.body.appendChild(preview);
+
+      reader = new FileReader();
+      reader.readAsDataURL(e.data); 
+      reader.onloadend = function() {
+        base64data = reader.result;
+        //console.log("Inside FileReader:" + base64data);
+        resolveData(base64data.toString());
+      }
+    };
+    recorder.start();
+    };
+
+  recordButton.innerText = "Recording... press to stop";
+
+  navigator.mediaDevices.getUserMedia({audio: true}).then(handleSuccess);
+
+
+  function toggleRecording() {
+    if (recorder && recorder.state == "recording") {
+        recorder.stop();
+        gumStream.getAudioTracks()[0].stop();
+        recordButton.innerText = "Saving the recording... pls wait!"
+    }
+  }
+
+  // resolved by the FileReader as soon as the recording is available
+  var resolveData;
+  var data = new Promise(resolve=>{
+  resolveData = resolve;
+  //recordButton.addEventListener("click", toggleRecording);
+  recordButton.onclick = ()=>{
+  toggleRecording()
+  }
+  });
+        
+  </script>
+  """
+
+  display_html(AUDIO_HTML)
+  data = eval_js("data")
+  binary = b64decode(data.split(',')[1])
+
+  if decoder:
+    return decoder.decode(binary), decoder.sample_rate
+  if pcm_format:
+    # one-shot decoder: no process is started for a next recording and nothing is left running
+    decoder = PCMDecoder(sample_rate, channels, pcm_format)
+    try:
+      decoder.feed(binary)
+      return decoder.flush(), decoder.sample_rate
+    finally:
+      decoder.close()
+
+  import ffmpeg
+  from scipy.io.wavfile import read as wav_read
+  process = (ffmpeg
+    .input('pipe:0')
+    .output('pipe:1', format='wav')
+    .run_async(pipe_stdin=True, pipe_stdout=True, pipe_stderr=True, quiet=True, overwrite_output=True)
+  )
+  output, err = process.communicate(input=binary)
+  
+  riff_chunk_size = len(output) - 8
+  # Break up the chunk size into four bytes, held in b.
+  q = riff_chunk_size
+  b = []
+  for i in range(4):
+      q, r = divmod(q, 256)
+      b.append(r)
+
+  # Replace bytes 4:8 in proc.stdout with the actual size of the RIFF chunk.
+  riff = output[:4] + bytes(b) + output[8:]
+
+  sr, audio = wav_read(BytesIO(riff))
+
+  return audio, sr
+
+
+class PCMDecoder:
+  """Long-lived ffmpeg process decoding compressed audio (e.g. the webm/opus recorded by the browser)
+  straight into raw PCM numpy arrays.
+
+  feed() sends compressed bytes as they arrive (e.g. chunks of the same recording) and read() returns
+  the samples decoded so far, so the same process decodes a whole stream. decode() handles a complete
+  recording and immediately starts the process for the next one, so it's ready when the next recording
+  arrives.
+
+  Usage example:
+    decoder = PCMDecoder(16000, 1, 's16le')
+    audio, sr = getAudio(decoder=decoder)
+    audio, sr = getAudio(decoder=decoder)
+    decoder.close()
+  """
+
+  DTYPES = {'f32le': '<f4', 'f64le': '<f8', 's16le': '<i2', 's32le': '<i4', 'u8': 'u1'}
+
+  def __init__(self, sample_rate=48000, channels=1, pcm_format='f32le'):
+    if pcm_format not in self.DTYPES:
+      raise ValueError(f"pcm_format must be one of {list(self.DTYPES)}, got {pcm_format!r}")
+    self.sample_rate = sample_rate
+    self.channels = channels
+    self.pcm_format = pcm_format
+    self.dtype = np.dtype(self.DTYPES[pcm_format])
+    self.process = None
+    self._start()
+
+  def _start(self):
+    import ffmpeg
+    args = (ffmpeg
+      .input('pipe:0')
+      .output('pipe:1', format=self.pcm_format, ar=self.sample_rate, ac=self.channels)
+      .compile()
+    )
+    self.process = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    self._buffer = bytearray()
+    self._lock = Lock()
+    self._reader = Thread(target=self._read_stdout, args=(self.process.stdout,), daemon=True)
+    self._reader.start()
+
+  def _read_stdout(self, stdout):
+    while True:
+      data = stdout.read1(1 << 16)
+      if not data:
+        break
+      with self._lock:
+        self._buffer += data
+
+  def feed(self, data):
+    """Sends compressed audio (bytes) to the decoder.
+    """
+    if self.process is None:
+      self._start()
+    self.process.stdin.write(data)
+    self.process.stdin.flush()
+
+  def read(self):
+    """Returns the samples decoded so far (numpy.ndarray, (samples,) or (samples, channels)).
+    """
+    frame_size = self.dtype.itemsize * self.channels
+    with self._lock:
+      n = len(self._buffer) - len(self._buffer) % frame_size
+      samples = np.frombuffer(bytes(self._buffer[:n]), dtype=self.dtype)
+      del self._buffer[:n]
+    return samples if self.channels == 1 else samples.reshape(-1, self.channels)
+
+  def flush(self):
+    """Ends the current stream, returning its remaining samples.
+    """
+    if self.process is None:
+      return self.read()
+    self.process.stdin.close()
+    self._reader.join()
+    self.process.wait()
+    self.process = None
+    return self.read()
+
+  def decode(self, data):
+    """Decodes a complete recording (bytes) and gets the process for the next one ready.
+    """
+    self.feed(data)
+    samples = self.flush()
+    self._start()
+    return samples
+
+  def close(self):
+    if self.process is not None:
+      self.process.kill()
+      self.process.wait()
+      self.process = None
+
+
+def getAudioStream(block_ms=250, timeout=1000):
+  """Records audio from your local microphone, yielding it while it's recorded (stops when the button is pressed).
+
+  An AudioWorklet grabs the raw samples inside the browser and sends them in blocks of about block_ms,
+  so there's nothing to decode on the Python side (no ffmpeg) and the processing can start right away.
+
+  Usage example:
+    for block, sr in getAudioStream():
+      ...
+
+  Returns
+  -------
+  generator
+    audio block (numpy.ndarray float32, mono, between -1 and 1), sample rate (int)
+  """
+
+  AUDIO_HTML = """
+  <div id="audio_stream_div"><button id="audio_stream_btn">Starting the microphone...</button></div>
+  <script>
+  const audio_worklet = `
+  class PCMCapture extends AudioWorkletProcessor {
+    process(inputs) {
+      if (inputs[0].length > 0) this.port.postMessage(inputs[0][0].slice(0));
+      return true;
+    }
+  }
+  registerProcessor('pcm-capture', PCMCapture);
+  `;
+
+  var audio_chunks = [];
+  var audio_pending = [];
+  var audio_pending_len = 0;
+  var audio_done = false;
+  var audio_sr = 0;
+
+  function audioB64(bytes){
+    var s = '';
+    for(let i = 0; i < bytes.length; i += 0x8000){
+      s += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+    }
+    return btoa(s);
+  }
+
+  function flushAudio(){
+    if(audio_pending_len == 0) return;
+    const block = new Float32Array(audio_pending_len);
+    let offset = 0;
+    for(const samples of audio_pending){
+      block.set(samples, offset);
+      offset += samples.length;
+    }
+    audio_chunks.push(audioB64(new Uint8Array(block.buffer)));
+    audio_pending = [];
+    audio_pending_len = 0;
+  }
+
+  async function startAudio(block_ms){
+    const btn = document.getElementById("audio_stream_btn");
+    const stream = await navigator.mediaDevices.getUserMedia({audio: true});
+    const ctx = new AudioContext();
+    audio_sr = ctx.sampleRate;
+    const block_len = Math.round(audio_sr*block_ms/1000);
+    const url = URL.createObjectURL(new Blob([audio_worklet], {type: 'application/javascript'}));
+    await ctx.audioWorklet.addModule(url);
+    const source = ctx.createMediaStreamSource(stream);
+    const node = new AudioWorkletNode(ctx, 'pcm-capture');
+    node.port.onmessage = (e) => {
+      audio_pending.push(e.data);
+      audio_pending_len += e.data.length;
+      if(audio_pending_len >= block_len) flushAudio();
+    };
+    source.connect(node);
+    node.connect(ctx.destination);
+    btn.innerText = "Recording... press to stop";
+    btn.onclick = () => {
+      stream.getAudioTracks()[0].stop();
+      source.disconnect();
+      node.disconnect();
+      ctx.close();
+      flushAudio();
+      audio_done = true;
+      btn.remove();
+    };
+  }
+
+  function getAudioChunks(timeout){
+    return new Promise(resolve=>{
+      const t0 = Date.now();
+      (function poll(){
+        if(audio_chunks.length > 0 || audio_done || Date.now() - t0 >= timeout){
+          resolve({chunks: audio_chunks.splice(0), done: audio_done, sr: audio_sr});
+        } else {
+          setTimeout(poll, 10);
+        }
+      })();
+    })
+  }
+  </script>
+  """
+
+  display_html(AUDIO_HTML)
+  eval_js("startAudio(%d)" % block_ms)
+  while True:
+    data = eval_js("getAudioChunks(%d)" % timeout)
+    for chunk in data['chunks']:
+      yield np.frombuffer(b64decode(chunk), dtype=np.float32), data['sr']
+    if data['done']:
+      return
@@ -0,0 +1,310 @@
+"""Bounding box transformations and dataset augmentation (augment_dataset, augment_generator)"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from PIL import Image, ImageDraw, ImageOps, ImageEnhance
+import numpy as np
+
+from .dataset import Dataset
+
+
+def drawbox(img, box):
+  """Draws one box [x_min, y_min, x_max, y_max] or an (N,4) array of boxes (normalized coordinates).
+  """
+  boxes, _ = _as_boxes(box)
+  draw = ImageDraw.Draw(img)
+  for rect in (boxes * (img.size * 2)).astype(int).tolist():
+    draw.rectangle(rect)
+  return img
+
+# Box transforms below accept one box [x_min, y_min, x_max, y_max] (returning a list, as before)
+# or an (N,4) numpy.ndarray with all the boxes of the image (returning another (N,4) array).
+
+def flip(img, box):
+  img = ImageOps.flip(img)
+  return img, transform_boxes(box, FLIP)
+
+def mirror(img, box):
+  img = ImageOps.mirror(img)
+  return img, transform_boxes(box, MIRROR)
+
+def flip_mirror(img, box):
+  img, box = flip(img, box)
+  img, box = mirror(img, box)
+  return img, box
+
+def _flip_mirror_img(img):
+  return ImageOps.mirror(ImageOps.flip(img))
+
+def rnd_solarize(img, seed=42):
+  rnd = np.random.RandomState(seed)
+  return ImageOps.solarize(img, threshold=rnd.randint(0,200,1))
+
+def rnd_brightness(img, seed=42):
+  rnd = np.random.RandomState(seed)
+  enhancer = ImageEnhance.Brightness(img)
+  return enhancer.enhance(rnd.rand())
+
+def rnd_translate(img, box, seed=42):
+  """Random translation that keeps all the boxes inside the image (not moving along an axis without room to move).
+  """
+  M = rnd_translate_matrix(img.size, box, seed)
+  x, y = M[0,2]*img.size[0], M[1,2]*img.size[1]
+  img = img.transform(img.size, Image.AFFINE, (1, 0, -x, 0, 1, -y))
+  return img, transform_boxes(box, M)
+
+
+# Affine transforms as 3x3 matrices acting on normalized (x, y, 1) coordinates, so several
+# geometric augmentations can be chained (e.g. translate_matrix(0.1, 0) @ FLIP) and applied
+# to the image with a single resample by apply_affine.
+FLIP = np.array([[1., 0., 0.], [0., -1., 1.], [0., 0., 1.]])
+MIRROR = np.array([[-1., 0., 1.], [0., 1., 0.], [0., 0., 1.]])
+
+def translate_matrix(dx, dy):
+  """Translation by (dx, dy), in normalized coordinates.
+  """
+  return np.array([[1., 0., dx], [0., 1., dy], [0., 0., 1.]])
+
+def rnd_translate_matrix(img_size, box, seed=42):
+  """Random translation (whole pixels) that keeps all the boxes inside an image of size img_size.
+  The shift is 0 along an axis where the boxes leave no room to move (e.g. a box spanning the whole width).
+  """
+  boxes, _ = _as_boxes(box)
+  w, h = img_size
+  x_lo, x_hi = boxes[:, [0, 2]].min(), boxes[:, [0, 2]].max()
+  y_lo, y_hi = boxes[:, [1, 3]].min(), boxes[:, [1, 3]].max()
+  rnd = np.random.RandomState(seed)
+  x = _rnd_shift(rnd, x_lo, x_hi, w)
+  y = _rnd_shift(rnd, y_lo, y_hi, h)
+  return translate_matrix(x/w, y/h)
+
+def _rnd_shift(rnd, lo, hi, size):
+  """Random shift in pixels keeping [lo, hi] (normalized) inside [0, 1], or 0 when there's no room to move.
+  """
+  low, high = int(-lo*size), int(size-hi*size)
+  if low >= high:
+    return 0
+  return rnd.randint(low, high, 1)[0]
+
+def transform_boxes(box, M):
+  """Applies the affine matrix M to all the boxes at once, returning the boxes enclosing the transformed corners.
+  """
+  boxes, single = _as_boxes(box)
+  xs = boxes[:, [0, 2, 0, 2]]
+  ys = boxes[:, [1, 1, 3, 3]]
+  tx = M[0,0]*xs + M[0,1]*ys + M[0,2]
+  ty = M[1,0]*xs + M[1,1]*ys + M[1,2]
+  boxes = np.stack([tx.min(axis=1), ty.min(axis=1), tx.max(axis=1), ty.max(axis=1)], axis=1)
+  return boxes[0].tolist() if single else boxes
+
+def apply_affine(img, box, M, resample=Image.BILINEAR):
+  """Resamples the image once with the (possibly composed) affine matrix M and transforms the boxes.
+  """
+  w, h = img.size
+  S = np.diag([w, h, 1.])
+  # PIL wants the output -> input mapping in pixels
+  inv = np.linalg.inv(S @ M @ np.linalg.inv(S))
+  img = img.transform(img.size, Image.AFFINE, tuple(inv[:2].ravel()), resample=resample)
+  return img, transform_boxes(box, M)
+
+def _as_boxes(box):
+  boxes = np.asarray(box, dtype=float)
+  return boxes.reshape(-1, 4), boxes.ndim == 1
+
+
+def augment_dataset(csvfilename, increaseby=3, seed=42, workers=1, chunksize=16, progress=None):
+  """Augment a dataset based on CSV format used by 
+  TFLite Model Maker Object Detector
+  https://cloud.google.com/vision/automl/object-detection/docs/csv-format
+
+  Rows are grouped by image, so each image is opened once and each augmented image is saved once
+  with one CSV row per box. workers > 1 (or None for one per CPU) augments the images in a process
+  pool, sending them in chunks of `chunksize` images. Each image uses its own seed (seed + image number),
+  so the output doesn't depend on the number of workers. progress(done, total) is called after each
+  image is augmented.
+  csvfilename can also be a Dataset, then a new Dataset with the original and the augmented rows is returned.
+  """
+  if isinstance(csvfilename, Dataset):
+    dataset = csvfilename
+    images = {} # path: [row indices]
+    for i, path in enumerate(dataset.paths.tolist()):
+      images.setdefault(path, []).append(i)
+    jobs = [(path, dataset.boxes[idx], increaseby, seed+i) for i,(path, idx) in enumerate(images.items())]
+    results = _run_augment(jobs, workers, chunksize, progress)
+
+    rows, paths, boxes = [np.arange(len(dataset))], [dataset.paths], [dataset.boxes]
+    for idx, variants in zip(images.values(), results):
+      for filename_aug, boxes_aug in variants:
+        rows.append(idx)
+        paths.append([filename_aug]*len(idx))
+        boxes.append(boxes_aug)
+    rows = np.concatenate(rows)
+    return dataset.select(rows, paths=np.concatenate(paths), boxes=np.concatenate(boxes))
+
+  with open(csvfilename,"r") as file:
+    ds = file.read()
+
+  images = {} # path: [rows]
+  for l in ds.splitlines():
+    r = l.split(',')
+    images.setdefault(r[1], []).append(r)
+  jobs = [(path, np.array([[float(fi) for fi in [r[3], r[4], r[7], r[8]]] for r in rows]), increaseby, seed+i)
+          for i,(path, rows) in enumerate(images.items())]
+  results = _run_augment(jobs, workers, chunksize, progress)
+
+  with open(csvfilename,"w") as file:
+    file.write(ds)
+    if ds and not ds.endswith("\n"):
+      file.write("\n")
+    for rows, variants in zip(images.values(), results):
+      for filename_aug, boxes_aug in variants:
+        file.write(_csv_rows(rows, filename_aug, boxes_aug))
+
+
+def _run_augment(jobs, workers, chunksize, progress):
+  results = []
+  if workers == 1:
+    _collect(map(_augment_image, jobs), results, len(jobs), progress)
+  else:
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+      _collect(executor.map(_augment_image, jobs, chunksize=chunksize), results, len(jobs), progress)
+  return results
+
+
+def _collect(results, output, total, progress):
+  for i, result in enumerate(results):
+    output.append(result)
+    if progress:
+      progress(i+1, total)
+
+
+def _csv_rows(rows, filename_aug, boxes):
+  return "".join(f"{r[0]},{filename_aug},{r[2]},{x_min:0.2f},{y_min:0.2f},,,{x_max:0.2f},{y_max:0.2f},,\n"
+                 for r, [x_min, y_min, x_max, y_max] in zip(rows, boxes.tolist()))
+
+
+def augment_generator(csvfilename, batch_size=8, increaseby=3, seed=42, epochs=1, shuffle=False,
+                      include_original=True, workers=0, prefetch=4, fixed=False):
+  """Generator yielding augmented batches on-the-fly, without writing any file.
+
+  The augmentations are the same ones augment_dataset saves to disk (flip, mirror, flip-mirror, random
+  translations and their solarized / brightness variants). The first epoch uses the same per image seeds
+  (so the same images) as augment_dataset and each next epoch draws new random translations and
+  photometric variants, unless fixed=True repeats the first epoch's augmentations. Each batch
+  is a tuple ([image arrays], [(N,4) boxes arrays], [label arrays]) with batch_size augmented images.
+  csvfilename can be a CSV file name or a Dataset. shuffle=True shuffles the images at each epoch
+  (seeded) and workers > 0 decodes / augments up to `prefetch` images ahead in background threads.
+
+  Usage example:
+    for images, boxes, labels in augment_generator("dataset.csv", batch_size=32):
+      ...
+  """
+  dataset = csvfilename if isinstance(csvfilename, Dataset) else Dataset.load(csvfilename)
+  images = {} # path: [row indices]
+  for i, path in enumerate(dataset.paths.tolist()):
+    images.setdefault(path, []).append(i)
+  images = list(images.items())
+  label_names = np.array(dataset.label_names, dtype=object)
+
+  def samples(job):
+    image_seed, (path, idx) = job
+    img_orig = _open_rgb(path)
+    boxes, labels = dataset.boxes[idx], label_names[dataset.labels[idx]]
+    out = [(np.asarray(img_orig), boxes, labels)] if include_original else []
+    rnd = np.random.RandomState(image_seed)
+    for basename, img, boxes_aug in _augmented_variants(img_orig, boxes, increaseby, rnd):
+      out.append((np.asarray(img), boxes_aug, labels))
+    return out
+
+  rnd = np.random.RandomState(seed)
+  batch = ([], [], [])
+  for epoch in range(epochs):
+    order = rnd.permutation(len(images)) if shuffle else range(len(images))
+    epoch_seed = seed if fixed else seed + epoch*len(images)
+    jobs = ((epoch_seed+i, images[i]) for i in order)
+    for image_samples in _prefetch(samples, jobs, workers, prefetch):
+      for sample in image_samples:
+        for column, value in zip(batch, sample):
+          column.append(value)
+        if len(batch[0]) == batch_size:
+          yield batch
+          batch = ([], [], [])
+  if batch[0]:
+    yield batch
+
+
+def _prefetch(func, jobs, workers, prefetch):
+  """Same as map(func, jobs), but running up to `prefetch` jobs ahead in `workers` threads.
+  """
+  if not workers:
+    yield from map(func, jobs)
+    return
+  with ThreadPoolExecutor(max_workers=workers) as executor:
+    pending = deque()
+    for job in jobs:
+      pending.append(executor.submit(func, job))
+      if len(pending) > prefetch:
+        yield pending.popleft().result()
+    while pending:
+      yield pending.popleft().result()
+
+
+def _open_rgb(path):
+  img = Image.open(path)
+  if img.mode not in ('RGB', 'L'):
+    img = img.convert('RGB')
+  return img
+
+
+def _augment_image(job):
+  """Augments one image and all its boxes, returning [(augmented image filename, (N,4) boxes), ...]
+  It's a module level function so augment_dataset can send it to worker processes.
+  """
+  path, boxes, increaseby, seed = job
+  rnd = np.random.RandomState(seed)
+  variants = []
+
+  extension = path.split(".")[-1]
+  filename = path[:-(len(extension)+1)]
+  for basename, img, boxes_aug in _augmented_variants(_open_rgb(path), boxes, increaseby, rnd):
+    filename_aug = filename + f"_{basename}_" + "." + extension
+    img.save(filename_aug)
+    variants.append((filename_aug, boxes_aug))
+
+  return variants
+
+
+def _augmented_variants(img_orig, boxes, increaseby, rnd):
+  """Generator yielding (name, PIL.Image, (N,4) boxes) for each augmentation of img_orig.
+  """
+  def augment(img, basename, boxes_aug):
+    """img and its photometric variants, all computed from a single decoded array.
+    """
+    yield basename, img, boxes_aug
+    arr = np.asarray(img)
+    for i in range(increaseby):
+      yield f"{basename}_sol_{i}", Image.fromarray(_solarize_lut(rnd.randint(0,200))[arr]), boxes_aug
+      yield f"{basename}_bright_{i}", Image.fromarray(_brightness_lut(rnd.rand())[arr]), boxes_aug
+
+  for basename, img_transform, M in [("flip", ImageOps.flip, FLIP),
+                                     ("mirror", ImageOps.mirror, MIRROR),
+                                     ("flip-mirror", _flip_mirror_img, MIRROR @ FLIP)]:
+    yield from augment(img_transform(img_orig), basename, transform_boxes(boxes, M))
+
+  for ri in range(increaseby):
+    img, boxes_aug = rnd_translate(img_orig, boxes, rnd.randint(2**31))
+    yield from augment(img, f"rnd_trans_{ri}", boxes_aug)
+
+
+def _solarize_lut(threshold):
+  """Same as ImageOps.solarize: inverts all the values above threshold.
+  """
+  lut = np.arange(256, dtype=np.uint8)
+  lut[threshold:] = 255 - lut[threshold:]
+  return lut
+
+def _brightness_lut(factor):
+  """Same as ImageEnhance.Brightness(img).enhance(factor).
+  """
+  return np.clip(np.arange(256) * factor, 0, 255).astype(np.uint8)
@@ -0,0 +1,544 @@
+"""Webcam capture: single frames (webcam2numpy) or a buffered stream (videoGrabber)"""
+
+from io import BytesIO
+from base64 import b64decode
+from time import sleep, perf_counter
+import json
+
+from PIL import Image
+import numpy as np
+
+from ._bridge import eval_js, display_html, run_in_bridge
+
+
+FRAME_TRANSPORTS = ('jpeg', 'webp', 'png', 'raw')
+FRAME_FITS = ('stretch', 'crop', 'letterbox')
+
+FRAME_JS = """
+  var frame_canvas = document.createElement('canvas');
+  var frame_ctx = frame_canvas.getContext('2d', {willReadFrequently: true});
+  var frame_cfg = {transport: '%s', quality: %f, gray: %s, width: %d, height: %d, fit: '%s', bgr: %s};
+  var frame_encode_ms = 0;
+
+  function bytes2b64(bytes){
+    var s = '';
+    for(let i = 0; i < bytes.length; i += 0x8000){
+      s += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+    }
+    return btoa(s);
+  }
+
+  function encodeFrame(source, w, h){
+    const t0 = performance.now();
+    let frame;
+    if(frame_cfg.width > 0){
+      [w,h] = [frame_cfg.width, frame_cfg.height];
+    }
+    frame_canvas.width = w;
+    frame_canvas.height = h;
+    frame_ctx.filter = (frame_cfg.gray && frame_cfg.transport != 'raw') ? 'grayscale(1)' : 'none';
+    // source size (the camera resolution for a video) to keep the aspect ratio when cropping / letterboxing
+    const sw = source.videoWidth || source.width || w;
+    const sh = source.videoHeight || source.height || h;
+    if(frame_cfg.fit == 'crop'){
+      const s = Math.max(w/sw, h/sh);
+      frame_ctx.drawImage(source, (sw - w/s)/2, (sh - h/s)/2, w/s, h/s, 0, 0, w, h);
+    } else if(frame_cfg.fit == 'letterbox'){
+      const s = Math.min(w/sw, h/sh);
+      frame_ctx.fillStyle = 'black';
+      frame_ctx.fillRect(0, 0, w, h);
+      frame_ctx.drawImage(source, 0, 0, sw, sh, (w - sw*s)/2, (h - sh*s)/2, sw*s, sh*s);
+    } else {
+      frame_ctx.drawImage(source, 0, 0, w, h);
+    }
+    if(frame_cfg.transport == 'raw'){
+      // RGB / BGR (or luma) bytes straight from the canvas, no codec involved
+      const px = frame_ctx.getImageData(0, 0, w, h).data;
+      const c = frame_cfg.gray ? 1 : 3;
+      const [r, b] = frame_cfg.bgr ? [2, 0] : [0, 2];
+      const out = new Uint8Array(w*h*c);
+      for(let i = 0, j = 0; i < px.length; i += 4){
+        if(c == 1){
+          out[j++] = (77*px[i] + 150*px[i+1] + 29*px[i+2]) >> 8;
+        } else {
+          out[j++] = px[i+r];
+          out[j++] = px[i+1];
+          out[j++] = px[i+b];
+        }
+      }
+      frame = 'raw:' + w + ',' + h + ',' + c + ';' + bytes2b64(out);
+    } else {
+      frame = frame_canvas.toDataURL('image/' + frame_cfg.transport, frame_cfg.quality);
+    }
+    frame_encode_ms = performance.now() - t0;
+    return frame;
+  }
+"""
+
+
+def _frame_js(transport, quality, gray, out_size, fit='stretch', channel_order='RGB'):
+  if transport not in FRAME_TRANSPORTS:
+    raise ValueError(f"transport must be one of {FRAME_TRANSPORTS}, got {transport!r}")
+  if fit not in FRAME_FITS:
+    raise ValueError(f"fit must be one of {FRAME_FITS}, got {fit!r}")
+  if channel_order not in ('RGB', 'BGR'):
+    raise ValueError(f"channel_order must be 'RGB' or 'BGR', got {channel_order!r}")
+  w, h = out_size if out_size else (0, 0)
+  bgr = transport == 'raw' and channel_order == 'BGR' # the other transports are reordered after decoding
+  return FRAME_JS % (transport, quality, "true" if gray else "false", w, h, fit, "true" if bgr else "false")
+
+
+def _video_constraints(camera_size=None, camera_fps=None):
+  """getUserMedia video constraints (ideal values, so the browser picks the closest the camera supports)"""
+  constraints = {}
+  if camera_size:
+    constraints.update(width={'ideal': camera_size[0]}, height={'ideal': camera_size[1]})
+  if camera_fps:
+    constraints['frameRate'] = {'ideal': camera_fps}
+  return json.dumps(constraints) if constraints else "true"
+
+
+def _preprocess(frame, channel_order='RGB', dtype=None, value_range=(0, 1), swapped=False, out=None):
+  """Turns a decoded frame into the array expected by a model: channel_order ('RGB' / 'BGR', unless the
+  browser already swapped the channels) and dtype (floats are scaled from 0..255 to value_range).
+  """
+  frame = np.asarray(frame)
+  if channel_order == 'BGR' and not swapped and frame.ndim == 3:
+    frame = frame[..., ::-1]
+  if dtype is None:
+    return frame
+  if np.dtype(dtype).kind == 'f':
+    low, high = value_range
+    if out is None:
+      out = np.empty(frame.shape, dtype)
+    np.multiply(frame, (high - low)/255, out=out, casting='unsafe')
+    out += low
+    return out
+  return frame.astype(dtype, copy=False)
+
+
+def _decode_frame(data, gray=False, out=None):
+  """Decodes a frame produced by encodeFrame (see FRAME_JS).
+
+  Raw frames become a numpy.ndarray (H,W,3) or (H,W) built with np.frombuffer (copied into `out`
+  when a preallocated array is passed), while the other transports are returned as PIL.Image.
+  """
+  if data.startswith('raw:'):
+    header, payload = data[4:].split(';', 1)
+    w, h, c = [int(v) for v in header.split(',')]
+    frame = np.frombuffer(b64decode(payload), dtype=np.uint8)
+    frame = frame.reshape((h, w) if c == 1 else (h, w, c))
+    if out is not None:
+      np.copyto(out, frame)
+      return out
+    return frame
+  img = _dataurl2image(data)
+  return img.convert('L') if gray else img
+
+
+def webcam2numpy(quality=0.8, size=(800,600), transport='jpeg', gray=False, out_size=None,
+                 fit='stretch', channel_order='RGB', dtype=None, value_range=(0, 1), camera_size=None):
+  """Saves images from your webcam into a numpy array.
+
+  transport selects how the frame leaves the browser: 'jpeg', 'webp' or 'png' (data URLs decoded with PIL)
+  or 'raw' (uncompressed RGB bytes, no codec on either side). gray converts to a single channel in the browser
+  and out_size=(w,h) downscales the frame on the canvas before it is transferred.
+
+  Preprocessing for a model input: fit decides how the frame is made out_size on the canvas ('stretch',
+  'crop' the center keeping the aspect ratio or 'letterbox' it with black bars), channel_order='BGR'
+  swaps the channels (in the browser for raw frames) and dtype (e.g. 'float32') converts the array,
+  scaling floats to value_range. The conversion happens after the transfer, because floats would
+  make the frames 4x bigger. camera_size=(w,h) asks the camera for that resolution instead of scaling
+  its default stream.
+
+  Returns
+  -------
+  numpy.ndarray
+  """
+
+  VIDEO_HTML = """
+  <div class="video_container">
+    <video autoplay
+    width=%d height=%d></video>
+    <div style='position: absolute;top: 40px; left: 40px; font-size: 40px; color: green;'>Click on the image to save!</div>
+  </div>
+
+  <script>
+  %s
+
+  var video = document.querySelector('video')
+
+  navigator.mediaDevices.getUserMedia({ video: %s })
+    .then(stream=> video.srcObject = stream)
+    
+  var data = new Promise(resolve=>{
+    video.onclick = ()=>{
+      var canvas = document.createElement('canvas')
+      var [w,h] = [video.offsetWidth, video.offsetHeight]
+      canvas.width = w
+      canvas.height = h
+      canvas.getContext('2d')
+            .drawImage(video, 0, 0, w, h)
+      video.srcObject.getVideoTracks()[0].stop()
+      video.replaceWith(canvas)
+      resolve(encodeFrame(canvas, w, h))
+    }
+  })
+  </script>
+  """
+
+  frame_js = _frame_js(transport, quality, gray, out_size, fit, channel_order)
+  handle = display_html(VIDEO_HTML % (size[0],size[1],frame_js,_video_constraints(camera_size)), display_id='videoHTML')
+  data = eval_js("data")
+  return _preprocess(_decode_frame(data, gray), channel_order, dtype, value_range, swapped=transport == 'raw')
+
+
+def videoGrabber(quality=0.8, size=(800,600), init_delay=100, showVideo=True, fps=15, buffer_size=30,
+                 transport='jpeg', gray=False, out_size=None, stats=None, fit='stretch', channel_order='RGB',
+                 dtype=None, value_range=(0, 1), camera_size=None, camera_fps=None, change_threshold=None,
+                 keepalive=1.0):
+  """Returns a video grabber object that saves images from your webcam into a PIL.Image object
+  (or a numpy.ndarray when transport='raw', channel_order='BGR' or dtype is used, see webcam2numpy for
+  transport, gray, out_size, fit, channel_order, dtype, value_range and camera_size).
+  Caveat: the returned video controller object can only be used inside the SAME cell because of sandboxing.
+  
+  Usage example:
+    vid = videoGrabber()
+    img_list = []
+    for i in range(10):
+      img_list.append(vid(10))
+    vid(stop=True)
+
+  Streaming example (the browser keeps capturing at `fps` into a ring buffer
+  of `buffer_size` frames and each round trip brings back up to `n` frames):
+    vid = videoGrabber(fps=30)
+    for img, timestamp in vid.frames(n=4):
+      ...
+    vid(stop=True)
+
+  stats (a TimingStats) records how long each stage (browser sleep / encode / buffer, transfer and decode)
+  takes for every frame.
+
+  Model-ready example (the browser crops the 640x480 camera stream to 320x320 and sends raw BGR bytes,
+  so only the pixels the model uses are transferred):
+    vid = videoGrabber(transport='raw', out_size=(320, 320), fit='crop', channel_order='BGR',
+                       dtype='float32', value_range=(-1, 1), camera_size=(640, 480), camera_fps=30)
+
+  change_threshold turns on a change detector inside the browser: frames whose 32x24 grayscale thumbnail
+  differs from the last delivered frame by less than change_threshold (mean absolute difference, 0-255)
+  are skipped before being encoded, unless keepalive seconds (None means never) passed since the last one.
+  vid(ms) then waits for the scene to change and the stream only buffers changed frames (vid.skipped
+  counts the frames skipped by the stream).
+    vid = videoGrabber(fps=15, change_threshold=4, keepalive=2)
+  """
+  return VideoGrabber(quality, size, init_delay, showVideo, fps, buffer_size, transport, gray, out_size, stats,
+                      fit, channel_order, dtype, value_range, camera_size, camera_fps, change_threshold, keepalive)
+
+
+class VideoGrabber:
+  """Video controller created by videoGrabber.
+
+  Calling the object, vid(ms), grabs a single frame (one eval_js round trip per frame),
+  while vid.frames(n) streams frames captured continuously by the browser.
+  """
+
+  VIDEO_HTML = """
+  <div id="video_container">
+    <video autoplay
+    width=%d height=%d></video>
+  </div>
+
+  <script>
+  %s
+
+  var video_div = document.getElementById("video_container");
+  if(!%s){
+    video_div.style.position = 'absolute';
+    video_div.style.left = '-9999px';
+  }
+  var video = document.querySelector('video');
+
+  var video_ready = false;
+
+  var frame_buffer = [];
+  var frames_dropped = 0;
+  var stream_timer = null;
+
+  // change detection: a frame is only delivered when its 32x24 luma thumbnail differs from the
+  // last delivered one by at least threshold (mean absolute difference, 0-255) or keepalive ms passed
+  var change_cfg = {threshold: %s, keepalive: %s, poll: %f};
+  var change_canvas = document.createElement('canvas');
+  change_canvas.width = 32;
+  change_canvas.height = 24;
+  var change_ctx = change_canvas.getContext('2d', {willReadFrequently: true});
+  var change_last = null;
+  var change_time = 0;
+  var frames_skipped = 0;
+
+  function sceneChanged(){
+    if(change_cfg.threshold === null) return true;
+    change_ctx.drawImage(video, 0, 0, 32, 24);
+    const px = change_ctx.getImageData(0, 0, 32, 24).data;
+    const luma = new Uint8Array(32*24);
+    for(let i = 0, j = 0; i < px.length; i += 4){
+      luma[j++] = (77*px[i] + 150*px[i+1] + 29*px[i+2]) >> 8;
+    }
+    const now = Date.now();
+    let changed = change_last === null || (change_cfg.keepalive !== null && now - change_time >= change_cfg.keepalive);
+    if(!changed){
+      let diff = 0;
+      for(let i = 0; i < luma.length; i++){
+        diff += Math.abs(luma[i] - change_last[i]);
+      }
+      changed = diff/luma.length >= change_cfg.threshold;
+    }
+    if(changed){
+      change_last = luma;
+      change_time = now;
+    }
+    return changed;
+  }
+
+  const nav = navigator.mediaDevices.getUserMedia({ video: %s })
+    .then(stream => {
+      video.srcObject = stream;
+      sleep(%f).then(() => video_ready = true);
+      });
+
+  // https://stackoverflow.com/a/951057
+  function sleep(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+  }
+
+
+  function grabFrame(){
+    return encodeFrame(video, video.offsetWidth, video.offsetHeight);
+  }
+
+
+  function getData(ms, timing){
+    if(video_ready){
+    return new Promise(resolve=>{
+      const t0 = performance.now();
+      sleep(ms).then(function grab(){
+        if(!sceneChanged()){
+          frames_skipped++;
+          sleep(change_cfg.poll).then(grab);
+          return;
+        }
+        const slept = performance.now() - t0;
+        const frame = grabFrame();
+        resolve(timing ? [frame, slept, frame_encode_ms] : frame);
+        });
+      })
+    }
+  }
+
+
+  function startStream(fps, buffer_size){
+    stopStream();
+    frame_buffer = [];
+    frames_dropped = 0;
+    frames_skipped = 0;
+    stream_timer = setInterval(() => {
+      if(!video_ready) return;
+      if(!sceneChanged()){
+        frames_skipped++;
+        return;
+      }
+      frame_buffer.push([Date.now(), grabFrame(), frame_encode_ms]);
+      // drop-oldest backpressure: Python is not keeping up
+      while(frame_buffer.length > buffer_size){
+        frame_buffer.shift();
+        frames_dropped++;
+      }
+    }, 1000/fps);
+  }
+
+
+  function stopStream(){
+    if(stream_timer !== null){
+      clearInterval(stream_timer);
+      stream_timer = null;
+    }
+  }
+
+
+  function getFrames(n, timeout){
+    return new Promise(resolve=>{
+      const t0 = Date.now();
+      (function poll(){
+        if(frame_buffer.length > 0 || Date.now() - t0 >= timeout){
+          const [dropped, skipped] = [frames_dropped, frames_skipped];
+          frames_dropped = 0;
+          frames_skipped = 0;
+          resolve({frames: frame_buffer.splice(0, n), dropped: dropped, skipped: skipped,
+                   waited: Date.now() - t0, now: Date.now()});
+        } else {
+          setTimeout(poll, 5);
+        }
+      })();
+    })
+  }
+
+
+  function stopVideo(){
+    stopStream();
+    video.srcObject.getVideoTracks()[0].stop();
+    frame_canvas.remove();
+    video.remove();
+    video_div.remove();
+  }
+
+  </script>
+  """
+
+  def __init__(self, quality=0.8, size=(800,600), init_delay=100, showVideo=True, fps=15, buffer_size=30,
+               transport='jpeg', gray=False, out_size=None, stats=None, fit='stretch', channel_order='RGB',
+               dtype=None, value_range=(0, 1), camera_size=None, camera_fps=None, change_threshold=None,
+               keepalive=1.0):
+    self.gray = gray
+    self.stats = stats
+    self.fps = fps
+    self.buffer_size = buffer_size
+    self.dropped = 0
+    self.skipped = 0
+    self.streaming = False
+    # what is left to do in Python after decoding (None when the frames are ready as they arrive)
+    swapped = transport == 'raw'
+    if dtype is None and (channel_order == 'RGB' or swapped):
+      self.preprocess = None
+    else:
+      self.preprocess = (channel_order, dtype, value_range, swapped)
+    frame_js = _frame_js(transport, quality, gray, out_size, fit, channel_order)
+    showVideo = "true" if showVideo else "false"
+    constraints = _video_constraints(camera_size, camera_fps)
+    threshold = "null" if change_threshold is None else "%f" % change_threshold
+    keepalive = "null" if keepalive is None else "%f" % (keepalive*1000)
+    self.handle = display_html(self.VIDEO_HTML % (size[0],size[1],frame_js,showVideo,threshold,keepalive,1000/fps,
+                                                  constraints,init_delay), display_id='videoHTML')
+
+  def __call__(self, ms=10, stop=False, out=None):
+    if not stop:
+      while True:
+        if self.stats is not None:
+          frame = self._timed_call(ms, out)
+          if frame is not None:
+            return frame
+        else:
+          data = eval_js("getData(%s)" % str(ms))
+          if data:
+            return self._decode(data, out)
+        sleep(0.1)
+    else:
+      self.stop()
+
+  def start(self, fps=None, buffer_size=None):
+    """Starts (or restarts) the continuous capture inside the browser.
+    """
+    self.fps = fps or self.fps
+    self.buffer_size = buffer_size or self.buffer_size
+    eval_js("startStream(%f, %d)" % (self.fps, self.buffer_size))
+    self.streaming = True
+
+  def read(self, n=4, timeout=1000):
+    """Pulls up to n buffered frames using a single eval_js call.
+
+    Returns
+    -------
+    list
+      [(frame, capture timestamp in seconds), ...] (empty if nothing arrived before timeout ms)
+    """
+    if not self.streaming:
+      self.start()
+    start = perf_counter()
+    data = eval_js("getFrames(%d, %d)" % (n, timeout))
+    self.dropped += data['dropped']
+    self.skipped += data['skipped']
+    if self.stats is not None:
+      return self._timed_frames(data, perf_counter() - start)
+    return [(self._decode(frame), timestamp/1000) for timestamp, frame, *_ in data['frames']]
+
+  def _timed_call(self, ms, out):
+    start = perf_counter()
+    data = eval_js("getData(%s, true)" % str(ms))
+    if not data:
+      return None
+    received = perf_counter()
+    data, slept, encoded = data
+    self.stats.record('sleep', slept/1000)
+    self.stats.record('encode', encoded/1000)
+    self.stats.record('transfer', received - start - (slept + encoded)/1000)
+    frame = self._decode(data, out)
+    self.stats.record('decode', perf_counter() - received)
+    return frame
+
+  def _timed_frames(self, data, elapsed):
+    stats = self.stats
+    stats.record('transfer', elapsed - data['waited']/1000)
+    frames = []
+    for timestamp, frame, encoded in data['frames']:
+      stats.record('encode', encoded/1000)
+      stats.record('buffer', (data['now'] - timestamp)/1000)
+      start = perf_counter()
+      frames.append((self._decode(frame), timestamp/1000))
+      stats.record('decode', perf_counter() - start)
+    return frames
+
+  def frames(self, n=4, timeout=1000):
+    """Generator yielding (frame, capture timestamp in seconds) until stop is called.
+    """
+    if not self.streaming:
+      self.start()
+    while self.streaming:
+      for frame in self.read(n, timeout):
+        if not self.streaming:
+          return
+        yield frame
+
+  def _decode(self, data, out=None):
+    if self.preprocess is None:
+      return _decode_frame(data, self.gray, out)
+    channel_order, dtype, value_range, swapped = self.preprocess
+    if dtype is None:
+      return _preprocess(_decode_frame(data, self.gray, out), channel_order, swapped=swapped)
+    return _preprocess(_decode_frame(data, self.gray), channel_order, dtype, value_range, swapped, out)
+
+  def stop(self):
+    self.streaming = False
+    eval_js("stopVideo()")
+
+  async def aread(self, n=4, timeout=1000):
+    """Awaitable read: the eval_js call and the decoding run in the bridge thread (see run_in_bridge).
+    While no frames arrive it holds that thread for up to timeout ms, delaying the other bridge calls
+    (e.g. ImageWindow.ashow), so use a short timeout when something else has to be shown meanwhile.
+    """
+    return await run_in_bridge(self.read, n, timeout)
+
+  def _read_streaming(self, n, timeout):
+    """read, unless stop was called while the call was waiting for the bridge thread (read would restart
+    the capture)"""
+    return self.read(n, timeout) if self.streaming else []
+
+  async def aframes(self, n=4, timeout=1000):
+    """Async generator yielding (frame, capture timestamp in seconds) until stop (or astop) is called.
+
+    Usage example:
+      async for img, timestamp in vid.aframes():
+        ...
+    """
+    if not self.streaming:
+      await run_in_bridge(self.start)
+    while self.streaming:
+      for frame in await run_in_bridge(self._read_streaming, n, timeout):
+        if not self.streaming:
+          return
+        yield frame
+
+  async def astop(self):
+    await run_in_bridge(self.stop)
+
+
+def _dataurl2image(data):
+  binary = b64decode(data.split(',')[1])
+  return Image.open(BytesIO(binary))
@@ -0,0 +1,828 @@
+"""Object detection datasets (TFLite Model Maker CSV / COCO): loading, downloading, splitting and deduplicating
+
+PIL and requests are only imported by the functions that need them.
+"""
+
+from io import BytesIO
+from uuid import uuid4
+from time import sleep
+import json
+from os.path import join, isdir, isfile
+from os import mkdir, makedirs, remove, replace
+from hashlib import sha1, sha256
+from collections import Counter, OrderedDict
+from urllib.parse import urlsplit
+from threading import Lock, Semaphore
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class Dataset:
+  """TFLite Model Maker dataset (set,path,label,x_min,y_min,,,x_max,y_max,,) held as NumPy columns.
+  https://cloud.google.com/vision/automl/object-detection/docs/csv-format
+
+  paths : numpy.ndarray (object) with the image path / URL of each box
+  labels : numpy.ndarray (int32) with indices into label_names
+  boxes : numpy.ndarray (N,4) float64 with [x_min, y_min, x_max, y_max] (normalized)
+  sets : numpy.ndarray (int8) with indices into set_names, which always starts with SET_TYPES
+
+  splitdataset, saveimgslocally and augment_dataset accept a Dataset instead of a CSV file name
+  and return a new Dataset, so a pipeline parses the CSV once (Dataset.load) and writes it once
+  (Dataset.save). CSV files get the coordinates with 2 decimals, like the other CSV writers of colab_utils,
+  while saving to a .npz file keeps the arrays (full precision) in binary form for instant reloading.
+
+  Usage example:
+    ds = Dataset.load("dataset.csv")
+    ds = saveimgslocally(ds, img_path="images")
+    ds = splitdataset(ds, stratify=True)
+    ds = augment_dataset(ds)
+    ds.save("dataset_augmented.csv")
+  """
+
+  SET_TYPES = ("TRAIN", "VALIDATION", "TEST", "UNASSIGNED")
+
+  def __init__(self, paths, labels, boxes, sets=None, label_names=None, set_names=None):
+    if label_names is None:
+      labels, label_names = _encode(labels)
+    if sets is None:
+      sets = [self.SET_TYPES.index("UNASSIGNED")]*len(paths)
+      set_names = self.SET_TYPES
+    elif set_names is None:
+      sets, set_names = _encode(sets, self.SET_TYPES)
+    self.paths = np.asarray(paths, dtype=object).reshape(-1)
+    self.labels = np.asarray(labels, dtype=np.int32).reshape(-1)
+    self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    self.sets = np.asarray(sets, dtype=np.int8).reshape(-1)
+    self.label_names = list(label_names)
+    self.set_names = list(set_names)
+
+  def __len__(self):
+    return len(self.paths)
+
+  @classmethod
+  def from_rows(cls, rows):
+    """Creates a Dataset from CSV rows already split into fields.
+    """
+    rows = [r for r in rows if len(r) >= 9]
+    boxes = np.array([(r[3], r[4], r[7], r[8]) for r in rows], dtype=np.float64).reshape(-1, 4)
+    return cls([r[1] for r in rows], [r[2] for r in rows], boxes, [r[0] for r in rows])
+
+  @classmethod
+  def load(cls, filename):
+    """Loads a Model Maker CSV or a .npz file saved by Dataset.save.
+    """
+    if filename.endswith(".npz"):
+      with np.load(filename) as data:
+        return cls(data["paths"].astype(object), data["labels"], data["boxes"], data["sets"],
+                   data["label_names"].tolist(), data["set_names"].tolist())
+    with open(filename, "r") as file:
+      return cls.from_rows(l.rstrip("\r\n").split(',') for l in file)
+
+  def save(self, filename):
+    """Saves as Model Maker CSV or, when filename ends with .npz, as NumPy arrays.
+    """
+    if filename.endswith(".npz"):
+      np.savez(filename, paths=self.paths.astype(str), labels=self.labels, boxes=self.boxes, sets=self.sets,
+               label_names=np.array(self.label_names, dtype=str), set_names=np.array(self.set_names, dtype=str))
+      return
+    with open(filename, "w") as file:
+      for r in self.rows():
+        file.write(",".join(r) + "\n")
+
+  def rows(self):
+    """Generator yielding each row as a list of CSV fields.
+    """
+    set_names = np.array(self.set_names, dtype=object)[self.sets].tolist()
+    label_names = np.array(self.label_names, dtype=object)[self.labels].tolist()
+    for s, path, label, [x_min, y_min, x_max, y_max] in zip(set_names, self.paths.tolist(), label_names, self.boxes.tolist()):
+      yield [s, path, label, f"{x_min:0.2f}", f"{y_min:0.2f}", "", "", f"{x_max:0.2f}", f"{y_max:0.2f}", "", ""]
+
+  def select(self, idx, paths=None, boxes=None, sets=None):
+    """New Dataset with the rows idx (indices or boolean mask), optionally replacing some columns.
+    """
+    return Dataset(self.paths[idx] if paths is None else paths,
+                   self.labels[idx],
+                   self.boxes[idx] if boxes is None else boxes,
+                   self.sets[idx] if sets is None else sets,
+                   self.label_names, self.set_names)
+
+  def images(self):
+    """Returns ({path: image index} in order of first appearance, image index of each row)
+    """
+    images = {}
+    row_img = [images.setdefault(path, len(images)) for path in self.paths.tolist()]
+    return images, np.array(row_img, dtype=np.int64)
+
+  def distribution(self):
+    """Number of boxes per label in each set, {set: {label: count}}, always with TRAIN, VALIDATION
+    and TEST (like splitdataset returns) and with any other set only when it has boxes.
+    """
+    counts = np.bincount(self.sets.astype(np.int64)*len(self.label_names) + self.labels,
+                         minlength=len(self.set_names)*len(self.label_names))
+    counts = counts.reshape(len(self.set_names), len(self.label_names))
+    return {set_type: {label: int(counts[s, li]) for li, label in enumerate(self.label_names) if counts[s, li]}
+            for s, set_type in enumerate(self.set_names) if set_type in self.SET_TYPES[:3] or counts[s].any()}
+
+
+def _encode(values, names=()):
+  """Returns (codes, names) so that names[codes[i]] == values[i]
+  """
+  index = {name: i for i, name in enumerate(names)}
+  codes = [index.setdefault(value, len(index)) for value in values]
+  return codes, list(index)
+
+
+def cocojson2modelmakercsv(cocojsonfilename, csvfilename=None, img_dir="", stream=False):
+  """Convert COCO json annotations saved using VGG Via Annotator into
+  TFLite Model Maker CSV format
+  https://www.robots.ox.ac.uk/~vgg/software/via/via.html
+  https://cloud.google.com/vision/automl/object-detection/docs/csv-format
+
+  Categories and images are looked up by their ids (they don't need to be contiguous) and
+  the CSV rows are written as the annotations are read. stream=True parses the json file
+  incrementally with ijson (pip install ijson), so memory only grows with the number of
+  images and categories, not with the number of annotations.
+  When csvfilename is None, the annotations are returned as a Dataset instead.
+  """
+  categories, images, annotations = _load_coco(cocojsonfilename, img_dir, stream)
+
+  def boxes():
+    for ann in annotations:
+      label = categories[ann['category_id']]
+      path, width, height = images[ann['image_id']]
+      bbox = [float(v) for v in ann['bbox']]
+      x_min = bbox[0]/width
+      x_max = (bbox[0]+bbox[2])/width
+      y_min = bbox[1]/height
+      y_max = (bbox[1]+bbox[3])/height
+      yield path, label, [x_min, y_min, x_max, y_max]
+
+  if csvfilename is None:
+    rows = list(boxes())
+    return Dataset([r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows])
+
+  with open(csvfilename,"w") as file: # set,path,label,x_min,y_min,,,x_max,y_max,,
+    for path, label, [x_min, y_min, x_max, y_max] in boxes():
+      file.write(f"UNASSIGNED,{path},{label},{x_min:0.2f},{y_min:0.2f},,,{x_max:0.2f},{y_max:0.2f},,\n")
+
+
+def _load_coco(cocojsonfilename, img_dir="", stream=False):
+  """Returns ({category id: name}, {image id: (path, width, height)}, iterable with the annotations)
+  """
+  def image_record(img):
+    try:
+      path = img['coco_url']
+    except KeyError as ke:
+      path = img_dir + img['file_name']
+    return path, float(img['width']), float(img['height'])
+
+  if stream:
+    try:
+      import ijson
+    except ImportError:
+      raise ImportError("stream=True needs ijson, try: pip install ijson")
+
+    def items(prefix):
+      with open(cocojsonfilename, "rb") as file:
+        yield from ijson.items(file, prefix)
+
+    categories = {cat['id']: cat['name'] for cat in items('categories.item')}
+    images = {img['id']: image_record(img) for img in items('images.item')}
+    return categories, images, items('annotations.item')
+
+  with open(cocojsonfilename) as file:
+    annot = json.load(file)
+  categories = {cat['id']: cat['name'] for cat in annot['categories']}
+  images = {img['id']: image_record(img) for img in annot['images']}
+  return categories, images, annot['annotations']
+
+
+def modelmakercsv2cocojson(csvfilename, cocojsonfilename, img_sizes=None):
+  """Convert a TFLite Model Maker CSV into COCO json annotations
+  (the reverse of cocojson2modelmakercsv).
+
+  COCO boxes are in pixels, so the size of each image is taken from img_sizes ({path: (width, height)})
+  or read from the header of the image file. Annotations are written while the CSV is read, only
+  images and categories are kept in memory.
+  """
+  categories = {} # label: id
+  images = {} # path: (id, width, height)
+  with open(csvfilename,"r") as file, open(cocojsonfilename,"w") as f:
+    f.write('{"annotations": [')
+    ann_id = 0
+    for l in file:
+      r = l.rstrip("\r\n").split(',')
+      if len(r) < 9:
+        continue
+      path, label = r[1], r[2]
+      if path not in images:
+        if img_sizes is not None:
+          width, height = img_sizes[path]
+        else:
+          from PIL import Image
+          with Image.open(path) as img:
+            width, height = img.size
+        images[path] = (len(images)+1, width, height)
+      if label not in categories:
+        categories[label] = len(categories)+1
+      img_id, width, height = images[path]
+      x_min, y_min, x_max, y_max = [float(v) for v in (r[3], r[4], r[7], r[8])]
+      bbox = [x_min*width, y_min*height, (x_max-x_min)*width, (y_max-y_min)*height]
+      ann_id += 1
+      ann = {"id": ann_id, "image_id": img_id, "category_id": categories[label],
+             "bbox": bbox, "area": bbox[2]*bbox[3], "iscrowd": 0}
+      f.write(("" if ann_id == 1 else ",") + json.dumps(ann))
+
+    f.write('], "images": ')
+    json.dump([dict({"id": img_id, "file_name": path, "width": width, "height": height},
+                    **({"coco_url": path} if "://" in path else {}))
+               for path, (img_id, width, height) in images.items()], f)
+    f.write(', "categories": ')
+    json.dump([{"id": cat_id, "name": label} for label, cat_id in categories.items()], f)
+    f.write('}\n')
+
+
+def saveimgslocally(csvfilename, newcsvfilename=None, img_path="", workers=8, per_host=4, retries=3, backoff=0.5,
+                    timeout=2, raw=False, session=None, cache=None, max_side=None, img_format='JPEG', quality=75):
+  """Download images from the TFLite Model Maker CSV
+  and generate a new CSV file
+  https://cloud.google.com/vision/automl/object-detection/docs/csv-format
+
+  Images are downloaded concurrently by `workers` threads sharing one pooled requests.Session
+  (at most `per_host` simultaneous requests to the same host), failed requests are retried
+  `retries` times with exponential backoff and raw=True saves the downloaded bytes as they are
+  instead of decoding / re-encoding them with PIL. The new CSV keeps the original row order and
+  drops the rows whose image could not be downloaded.
+
+  When cache (a directory or a DownloadCache) is used, images are stored in the cache instead
+  of img_path and the new CSV points to the cached files, so URLs already downloaded (by this or
+  any other CSV) are not fetched again. Re-encoded images are cached per URL, img_format, quality
+  and max_side, so asking for another size or format downloads (and re-encodes) them again.
+
+  max_side resizes the images while they are ingested so their longest side is at most max_side pixels
+  (normalized box coordinates stay valid), saving them as img_format ('JPEG', 'PNG' or 'WEBP') with the
+  given quality (see reencode_image). raw is ignored when max_side is used.
+
+  csvfilename can also be a Dataset, then the new Dataset is returned (and saved only if
+  newcsvfilename is given). For a CSV file, newcsvfilename is required.
+  """
+  if not newcsvfilename and not isinstance(csvfilename, Dataset):
+    raise ValueError("newcsvfilename is required when csvfilename is a CSV file")
+  ext = IMG_EXTENSIONS[img_format] if not raw or max_side else ".jpg"
+  if cache is not None and not isinstance(cache, DownloadCache):
+    cache = DownloadCache(cache, ext=ext)
+  if img_path and cache is None:
+    if not isdir(img_path):
+      mkdir(img_path)
+  if isinstance(csvfilename, Dataset):
+    dataset = csvfilename
+    urls = dataset.paths.tolist()
+  else:
+    dataset = None
+    with open(csvfilename,"r") as file:
+      rows = [l.split(',') for l in file.read().splitlines()]
+    urls = [r[1] for r in rows]
+
+  # the cache key tells apart the same URL re-encoded with different parameters
+  variant = "" if raw and not max_side else f" {img_format},{quality},{max_side}"
+  img_names = []
+  downloads = {} # img_name (or cache key when using the cache): url
+  img_i = 0
+  last_url = ""
+  img_name = ""
+  for url in urls:
+    if cache is not None:
+      img_name = url + variant
+      if img_name not in downloads and cache.get(img_name) is None:
+        downloads[img_name] = url
+    elif url != last_url:
+      img_i += 1
+      img_name = join(img_path,f"image_{img_i}{ext}")
+      if not isfile(img_name):
+        downloads[img_name] = url
+    last_url = url
+    img_names.append(img_name)
+
+  downloader = _Downloader(workers, per_host, retries, backoff, timeout, raw, session, max_side, img_format, quality)
+  if cache is not None:
+    try:
+      saved = downloader.download_all(downloads, lambda key, url, content: cache.put(key, content))
+    finally:
+      cache.save()
+    paths = [cache.get(img_name) for img_name in img_names]
+  else:
+    saved = downloader.download_all(downloads, _write_file)
+    paths = [saved.get(img_name, img_name) for img_name in img_names]
+
+  if dataset is not None:
+    keep = np.array([bool(path) for path in paths], dtype=bool)
+    dataset = dataset.select(keep, paths=[path for path in paths if path])
+    if newcsvfilename:
+      dataset.save(newcsvfilename)
+    return dataset
+
+  with open(newcsvfilename,"w") as f:
+    for r, path in zip(rows, paths):
+      if path:
+        r[1] = path
+        f.write(",".join(r) + "\n")
+
+
+IMG_EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+
+
+def reencode_image(content, max_side=None, img_format='JPEG', quality=75):
+  """Decodes an image (bytes), shrinks it so its longest side is at most max_side (keeping the
+  aspect ratio, so normalized boxes stay valid) and encodes it again as img_format.
+
+  JPEGs are decoded with PIL's draft mode, so the downscaling by powers of 2 happens for free
+  inside the JPEG decoder and only the remaining factor is resampled.
+  """
+  from PIL import Image
+  img = Image.open(BytesIO(content))
+  if max_side:
+    w, h = img.size
+    scale = max_side/max(w, h)
+    if scale < 1:
+      size = (max(1, round(w*scale)), max(1, round(h*scale)))
+      img.draft('RGB', size)
+      img = img.resize(size, Image.BILINEAR) if img.size != size else img
+  if img.mode not in ('RGB', 'L'):
+    img = img.convert('RGB') if img_format == 'JPEG' or 'A' not in img.getbands() else img.convert('RGBA')
+  imageBuffer = BytesIO()
+  if img_format == 'PNG':
+    img.save(imageBuffer, format=img_format)
+  else:
+    img.save(imageBuffer, format=img_format, quality=quality)
+  return imageBuffer.getvalue()
+
+
+def _write_file(img_name, url, content):
+  with open(img_name, "wb") as f:
+    f.write(content)
+  print(f"Image {img_name} saved!")
+  return img_name
+
+
+class DownloadCache:
+  """On-disk cache of downloaded files keyed by URL.
+
+  A manifest (manifest.json inside cache_dir) maps each URL to its file, so interrupted runs resume
+  where they stopped and the same URL is fetched only once no matter how many CSVs use it
+  (saveimgslocally appends its re-encoding parameters to the URL of the images it re-encodes).
+  With hash_content=True files are named after the SHA-256 of their content, so different URLs
+  pointing to the same image share one file. When max_size (bytes) is set, the least recently used
+  entries are evicted (never the ones used since this object was created).
+  """
+
+  MANIFEST = "manifest.json"
+
+  def __init__(self, cache_dir, max_size=None, hash_content=False, ext=".jpg"):
+    self.cache_dir = cache_dir
+    self.max_size = max_size
+    self.hash_content = hash_content
+    self.ext = ext
+    if not isdir(cache_dir):
+      makedirs(cache_dir)
+    self.entries = OrderedDict() # url: {"file": name, "size": bytes}, least recently used first
+    manifest = join(cache_dir, self.MANIFEST)
+    if isfile(manifest):
+      with open(manifest) as f:
+        self.entries.update(json.load(f)["entries"])
+    self._refs = Counter(entry["file"] for entry in self.entries.values())
+    self.size = sum(entry["size"] for url, entry in self._unique_files())
+    self._pinned = set()
+    self._lock = Lock()
+    self._unsaved = 0
+
+  def get(self, url):
+    """Returns the path to the cached file or None when url is not in the cache.
+    """
+    with self._lock:
+      entry = self.entries.get(url)
+      if entry is None:
+        return None
+      path = join(self.cache_dir, entry["file"])
+      if not isfile(path):
+        self._remove(url)
+        return None
+      self.entries.move_to_end(url)
+      self._pinned.add(url)
+      return path
+
+  def put(self, url, content):
+    """Stores the content downloaded from url and returns the path to the cached file.
+    """
+    if self.hash_content:
+      name = sha256(content).hexdigest() + self.ext
+    else:
+      name = sha1(url.encode()).hexdigest() + self.ext
+    path = join(self.cache_dir, name)
+    if not self.hash_content or not isfile(path):
+      tmp_path = path + f".{uuid4().hex}.tmp"
+      with open(tmp_path, "wb") as f:
+        f.write(content)
+      replace(tmp_path, path)
+
+    with self._lock:
+      # the new reference is counted first, so replacing an entry never deletes the file it's about to use
+      if self._refs[name] == 0:
+        self.size += len(content)
+      self._refs[name] += 1
+      if url in self.entries:
+        old = self.entries[url]
+        if old["file"] == name:
+          self.size += len(content) - old["size"]
+        self._remove(url)
+      self.entries[url] = {"file": name, "size": len(content)}
+      self._pinned.add(url)
+      self._evict()
+      self._unsaved += 1
+      if self._unsaved >= 100:
+        self._save()
+    return path
+
+  def save(self):
+    with self._lock:
+      self._save()
+
+  def _save(self):
+    manifest = join(self.cache_dir, self.MANIFEST)
+    with open(manifest + ".tmp", "w") as f:
+      json.dump({"entries": self.entries}, f)
+    replace(manifest + ".tmp", manifest)
+    self._unsaved = 0
+
+  def _remove(self, url):
+    entry = self.entries.pop(url)
+    self._refs[entry["file"]] -= 1
+    if self._refs[entry["file"]] <= 0:
+      del self._refs[entry["file"]]
+      self.size -= entry["size"]
+      path = join(self.cache_dir, entry["file"])
+      if isfile(path):
+        remove(path)
+
+  def _evict(self):
+    if self.max_size is None:
+      return
+    for url in list(self.entries):
+      if self.size <= self.max_size:
+        break
+      if url not in self._pinned:
+        self._remove(url)
+
+  def _unique_files(self):
+    seen = set()
+    for url, entry in self.entries.items():
+      if entry["file"] not in seen:
+        seen.add(entry["file"])
+        yield url, entry
+
+
+class _Downloader:
+  """Thread pool used by saveimgslocally to download (url, filename) pairs.
+  """
+
+  def __init__(self, workers=8, per_host=4, retries=3, backoff=0.5, timeout=2, raw=False, session=None,
+               max_side=None, img_format='JPEG', quality=75):
+    self.max_side = max_side
+    self.img_format = img_format
+    self.quality = quality
+    self.workers = workers
+    self.per_host = per_host
+    self.retries = retries
+    self.backoff = backoff
+    self.timeout = timeout
+    self.raw = raw
+    if session is None:
+      import requests.adapters
+      session = requests.Session()
+      adapter = requests.adapters.HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+      session.mount("http://", adapter)
+      session.mount("https://", adapter)
+    self.session = session
+    self._hosts = {}
+    self._hosts_lock = Lock()
+
+  def download_all(self, downloads, store):
+    """Downloads {key: url} calling store(key, url, content) for each successful download
+    and returns {key: value returned by store (None when the download failed)}
+    """
+    with ThreadPoolExecutor(max_workers=self.workers) as executor:
+      futures = {key: executor.submit(self.download, key, url, store) for key, url in downloads.items()}
+      return {key: future.result() for key, future in futures.items()}
+
+  def download(self, key, url, store):
+    content = self.get(url)
+    if content is None:
+      return None
+    if not self.raw or self.max_side:
+      try:
+        content = reencode_image(content, self.max_side, self.img_format, self.quality)
+      except (OSError, ValueError) as e:
+        print(f"URL {url} failed?!? {e}")
+        return None
+    return store(key, url, content)
+
+  def get(self, url):
+    """Returns the content downloaded from url or None after all the retries failed.
+    """
+    import requests
+    with self._host_semaphore(url):
+      for attempt in range(self.retries + 1):
+        if attempt:
+          sleep(self.backoff * 2**(attempt-1))
+        try:
+          response = self.session.get(url, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+          status = e.__class__.__name__
+          continue
+        status = response.status_code
+        if status == 200:
+          return response.content
+        if status != 429 and status < 500:
+          break # client errors will not go away by retrying
+    print(f"URL {url} failed?!? {status}")
+    return None
+
+  def _host_semaphore(self, url):
+    host = urlsplit(url).netloc
+    with self._hosts_lock:
+      if host not in self._hosts:
+        self._hosts[host] = Semaphore(self.per_host)
+      return self._hosts[host]
+
+
+def dedupimages(csvfilename, newcsvfilename=None, threshold=4, workers=8):
+  """Finds duplicated images in a TFLite Model Maker CSV (local image files, e.g. after saveimgslocally)
+  and merges their annotations into one image (the first one appearing in the CSV).
+  https://cloud.google.com/vision/automl/object-detection/docs/csv-format
+
+  Exact duplicates have the same SHA-256, near duplicates (resized, recompressed...) have 64 bits
+  perceptual hashes (dHash) differing in at most `threshold` bits. The hashes are indexed by
+  band (multi-index hashing), so only images sharing a band are compared and the whole search stays
+  close to linear. Repeated boxes (same label and coordinates) of merged images are dropped.
+  threshold goes from 0 (only identical hashes) to 63, larger thresholds make narrower bands and
+  slower searches. Images that can't be read are reported and left as they are.
+
+  The new CSV is written to newcsvfilename (the input file is replaced when it's None).
+  csvfilename can also be a Dataset, then the deduplicated Dataset is returned.
+
+  Returns
+  -------
+  dict
+    {duplicated image path: path of the image kept}
+  """
+  if not 0 <= threshold < 64:
+    raise ValueError(f"threshold must be between 0 and 63 bits, got {threshold}")
+  dataset = csvfilename if isinstance(csvfilename, Dataset) else Dataset.load(csvfilename)
+  images, row_img = dataset.images()
+  paths = list(images)
+
+  with ThreadPoolExecutor(max_workers=workers) as executor:
+    hashes = list(executor.map(_image_hashes, paths))
+  valid = [i for i, h in enumerate(hashes) if h is not None] # index of each hashed image in paths
+  sha = [hashes[i][0] for i in valid]
+  thumbs = np.stack([hashes[i][1] for i in valid]) if valid else np.zeros((0, 8, 9), dtype=np.uint8)
+  phash = _dhash(thumbs)
+
+  canonical = _UnionFind(len(paths))
+  first = {}
+  for i, h in enumerate(sha):
+    canonical.union(valid[first.setdefault(h, i)], valid[i])
+  for i, j in _near_duplicates(phash, threshold):
+    canonical.union(valid[i], valid[j])
+
+  img_keep = np.array([canonical.find(i) for i in range(len(paths))], dtype=np.int64)
+  new_paths = np.array(paths, dtype=object)[img_keep][row_img]
+  merged = dataset.select(slice(None), paths=new_paths)
+
+  # drop the boxes repeated by the merged images
+  seen = set()
+  keep = []
+  for i, row in enumerate(zip(merged.paths.tolist(), merged.labels.tolist(), map(tuple, np.round(merged.boxes, 2).tolist()))):
+    if row not in seen:
+      seen.add(row)
+      keep.append(i)
+  merged = merged.select(np.array(keep, dtype=np.int64))
+
+  duplicates = {paths[i]: paths[k] for i, k in enumerate(img_keep.tolist()) if i != k}
+  if isinstance(csvfilename, Dataset):
+    if newcsvfilename:
+      merged.save(newcsvfilename)
+    return merged
+  merged.save(newcsvfilename or csvfilename)
+  return duplicates
+
+
+def _image_hashes(path):
+  """Returns (SHA-256 of the file, 8x9 grayscale thumbnail used by the perceptual hash)
+  or None when the image can't be read.
+  """
+  from PIL import Image
+  try:
+    with open(path, "rb") as f:
+      content = f.read()
+    img = Image.open(BytesIO(content))
+    img.draft('L', (64, 64))
+    thumb = np.asarray(img.convert('L').resize((9, 8), Image.BILINEAR))
+  except (OSError, ValueError, Image.DecompressionBombError) as e:
+    print(f"Image {path} failed?!? {e}")
+    return None
+  return sha256(content).hexdigest(), thumb
+
+
+def _dhash(thumbs):
+  """64 bits difference hash of each (8,9) thumbnail, computed for all of them at once.
+  """
+  bits = thumbs[:, :, 1:] > thumbs[:, :, :-1]
+  return np.packbits(bits.reshape(len(thumbs), 64), axis=1).view('>u8').reshape(-1).astype(np.uint64)
+
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def _popcount(x):
+  """Number of bits set in each uint64 of x (same shape as x), using a byte lookup table.
+  """
+  x = np.ascontiguousarray(x, dtype=np.uint64)
+  return _POPCOUNT8[x.view(np.uint8)].reshape(x.shape + (8,)).sum(axis=-1, dtype=np.uint8)
+
+
+def _near_duplicates(phash, threshold, block_size=1024):
+  """Pairs of indices whose hashes differ in at most threshold bits.
+
+  With threshold+1 bands of bits, two hashes within the threshold must have at least one identical
+  band (pigeonhole principle), so only the hashes sharing a band value are compared. Large buckets
+  (flat images have many zero bits) are compared block_size rows at a time to bound the memory used.
+  """
+  unique, first, inverse = np.unique(phash, return_index=True, return_inverse=True)
+  inverse = inverse.reshape(-1)
+  for i in range(len(phash)): # identical hashes
+    if first[inverse[i]] != i:
+      yield first[inverse[i]], i
+  if threshold <= 0 or len(unique) < 2:
+    return
+
+  bands = threshold+1
+  width = 64 // bands
+  for b in range(bands):
+    shift = np.uint64(b*width)
+    bits = 64 - b*width if b == bands-1 else width
+    keys = (unique >> shift) & np.uint64((1 << bits) - 1)
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)]
+    for s, e in zip(starts.tolist(), ends.tolist()):
+      if e - s < 2:
+        continue
+      group = unique[order[s:e]]
+      group_first = first[order[s:e]]
+      for r in range(0, len(group), block_size):
+        # rows r..r+block_size against themselves and the columns after them
+        distances = _popcount(group[r:r+block_size, None] ^ group[None, r:])
+        for i, j in zip(*np.nonzero(np.triu(distances <= threshold, 1))):
+          yield group_first[r+i], group_first[r+j]
+
+
+class _UnionFind:
+  """Disjoint sets where the representative is always the smallest index (first image in the CSV).
+  """
+
+  def __init__(self, n):
+    self.parent = list(range(n))
+
+  def find(self, i):
+    root = i
+    while self.parent[root] != root:
+      root = self.parent[root]
+    while self.parent[i] != root:
+      self.parent[i], i = root, self.parent[i]
+    return root
+
+  def union(self, i, j):
+    i, j = self.find(i), self.find(j)
+    if i != j:
+      self.parent[max(i, j)] = min(i, j)
+
+
+def splitdataset(csvfilename, train_val_test_ratios=[0.8,0.1,0.1], seed=42, newcsvfilename=None, stratify=False):
+  """Read and split a dataset (TFLite Model Maker format) according
+  to the ratios
+  https://cloud.google.com/vision/automl/object-detection/docs/csv-format
+
+  All the rows of an image (same path, contiguous or not) go to the same set. The rows are
+  streamed to newcsvfilename (the input file is replaced when it's None).
+  stratify=True assigns the images so each set gets its share of the boxes of every label
+  (see _stratified_split) instead of shuffling the images uniformly.
+  csvfilename can also be a Dataset, then the split Dataset is returned (use its distribution method
+  for the number of boxes per label in each set) and saved only if newcsvfilename is given.
+
+  Returns
+  -------
+  dict
+    number of boxes per label in each set, {"TRAIN": {label: count}, "VALIDATION": ..., "TEST": ...}
+  """
+  if isinstance(csvfilename, Dataset):
+    dataset = csvfilename
+    images, row_img = dataset.images()
+    img_set = _split_images(row_img.tolist(), dataset.labels.tolist(), len(images), train_val_test_ratios, seed, stratify)
+    dataset = dataset.select(slice(None), sets=np.array(img_set, dtype=np.int8)[row_img])
+    if newcsvfilename:
+      dataset.save(newcsvfilename)
+    return dataset
+
+  images = {} # path: image index, in order of first appearance
+  labels = {} # label: label index
+  row_img, row_label = [], []
+  with open(csvfilename,"r") as file:
+    for l in file:
+      r = l.split(',', 3)
+      if len(r) < 3:
+        continue
+      row_img.append(images.setdefault(r[1], len(images)))
+      row_label.append(labels.setdefault(r[2], len(labels)))
+
+  set_types = list(Dataset.SET_TYPES[:3])
+  img_set = _split_images(row_img, row_label, len(images), train_val_test_ratios, seed, stratify)
+
+  _write_splits(csvfilename, newcsvfilename, images, [set_types[s] for s in img_set])
+
+  row_set = np.array(img_set, dtype=np.int64)[np.array(row_img, dtype=np.int64)]
+  counts = np.bincount(row_set*len(labels) + np.array(row_label, dtype=np.int64),
+                       minlength=len(set_types)*len(labels)).reshape(len(set_types), len(labels))
+  return {set_type: {label: int(counts[s, li]) for label, li in labels.items() if counts[s, li]}
+          for s, set_type in enumerate(set_types)}
+
+
+def _split_images(row_img, row_label, img_idx, train_val_test_ratios, seed=42, stratify=False):
+  """Returns the set (0: TRAIN, 1: VALIDATION, 2: TEST) of each image.
+  """
+  if stratify:
+    image_hist = [Counter() for _ in range(img_idx)]
+    for i, label in zip(row_img, row_label):
+      image_hist[i][label] += 1
+    return _stratified_split(image_hist, train_val_test_ratios, seed)
+
+  split_ratios = [round(img_idx*i) for i in train_val_test_ratios]
+  shuffled = np.arange(img_idx)
+  rnd = np.random.RandomState(seed)
+  rnd.shuffle(shuffled)
+
+  img_set = np.empty(img_idx, dtype=np.int8)
+  img_set[shuffled[:split_ratios[0]]] = 0
+  img_set[shuffled[split_ratios[0]:split_ratios[0]+split_ratios[1]]] = 1
+  img_set[shuffled[split_ratios[0]+split_ratios[1]:]] = 2
+  return img_set.tolist()
+
+
+def _stratified_split(image_hist, train_val_test_ratios, seed=42):
+  """Assigns each image (with all its boxes) to a set (0, 1 or 2), balancing the boxes of each label.
+
+  Greedy iterative stratification: images are visited starting by the ones having the rarest labels
+  (ties in random order) and each goes to the set still missing the largest fraction of its share of
+  boxes of its rarest label (then of its share of images). Using fractions instead of absolute counts
+  lets the small sets get rare labels too, e.g. a label on 3 images goes to TRAIN, VALIDATION and TEST.
+  It only needs the label histograms, so it's O(images log images).
+  """
+  totals = Counter()
+  for hist in image_hist:
+    totals.update(hist)
+  ratios = [r/sum(train_val_test_ratios) for r in train_val_test_ratios]
+  target_boxes = [{label: ratio*total for label, total in totals.items()} for ratio in ratios]
+  target_images = [ratio*len(image_hist) for ratio in ratios]
+  wanted_boxes = [dict(target) for target in target_boxes]
+  wanted_images = list(target_images)
+  sets = [s for s, ratio in enumerate(ratios) if ratio > 0]
+
+  rnd = np.random.RandomState(seed)
+  tie_breaker = rnd.permutation(len(image_hist)).tolist()
+  rarest = [min(hist, key=totals.__getitem__) for hist in image_hist]
+  order = sorted(range(len(image_hist)), key=lambda i: (totals[rarest[i]], tie_breaker[i]))
+
+  img_set = [0]*len(image_hist)
+  for i in order:
+    label = rarest[i]
+    s = max(sets, key=lambda s: (wanted_boxes[s][label]/target_boxes[s][label], wanted_images[s]/target_images[s]))
+    img_set[i] = s
+    wanted_images[s] -= 1
+    for label, count in image_hist[i].items():
+      wanted_boxes[s][label] -= count
+  return img_set
+
+
+def _write_splits(csvfilename, newcsvfilename, images, img_set):
+  """Streams the rows of csvfilename replacing the set of each row by img_set[images[path]].
+  """
+  newcsvfilename = newcsvfilename or csvfilename
+  tmp_filename = newcsvfilename + f".{uuid4().hex}.tmp"
+  with open(csvfilename,"r") as file, open(tmp_filename,"w") as f:
+    for l in file:
+      r = l.rstrip("\r\n").split(',')
+      if len(r) < 3: # same lines skipped by splitdataset when indexing the images
+        continue
+      r[0] = img_set[images[r[1]]]
+      f.write(",".join(r) + "\n")
+  replace(tmp_filename, newcsvfilename)
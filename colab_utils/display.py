@@ -0,0 +1,429 @@
+"""Showing (imshow), annotating (labelImage, showAnnotations) and copying stuff in the notebook"""
+
+from io import BytesIO
+from base64 import b64encode
+from os.path import getmtime
+from time import perf_counter
+import json
+
+from PIL import Image, ImageDraw
+import numpy as np
+
+from ._bridge import eval_js, display_html, display_js, execution_count, run_in_bridge
+
+
+def labelImage(inputImg, imgformat='PNG', deleteAfter=True, scale = 1.0, line_color="green"):
+  """Opens an image, record mouse clicks (boxes) and labels.
+
+  Returns
+  -------
+  list
+     [box (list), label (str)]
+
+  """
+
+  JS_SRC = """
+    async function label_image(scale) {
+      const image  = document.getElementById("inputImage");
+      const w = image.width;
+      const h = image.height;
+
+      const image_div = document.getElementById("image_div");
+
+      const ok_btn = document.createElement('button');
+      ok_btn.textContent = 'Finish';
+      const add_btn = document.createElement('button');
+      add_btn.textContent = 'Add';
+      const clr_btn = document.createElement('button');
+      clr_btn.textContent = 'Clear';
+      const textbox = document.createElement('input');
+      textbox.textContent = "text";
+
+      const canvas = document.createElement('canvas');
+      canvas.width = w;
+      canvas.height = h;
+
+      var ctx = canvas.getContext('2d');
+      canvas.style.position = 'absolute';
+      canvas.style.left = '0px';
+      canvas.style.top = '0px';
+      canvas.style.z_index = 1000;
+      canvas.style.border = 0;
+      canvas.style.padding = 0;
+      canvas.style.margin = 0;
+
+      //ctx.fillStyle = "blue";
+      //ctx.fillRect(0, 0, canvas.width, canvas.height);
+
+      image_div.appendChild(canvas);
+
+      const interface_div = document.getElementById("interface_div");
+      interface_div.appendChild(textbox);
+      interface_div.appendChild(add_btn);
+      interface_div.appendChild(ok_btn);
+      interface_div.appendChild(clr_btn);
+
+      textbox.width = 100;
+
+      var x1,x2,y1,y2;
+
+      var clickNumber = 0;
+
+      var boxes = new Array();
+
+      var try_again = true;
+      
+      while (try_again){
+      await new Promise((resolve) => {
+        canvas.onclick = () => {
+            console.log("X:"+event.clientX+" Y:"+event.clientY); 
+            if(clickNumber==0){
+                            x1 = event.clientX;
+                            y1 = event.clientY;
+                            clickNumber = 1;
+            }else if(clickNumber==1){
+                            x2 = event.clientX;
+                            y2 = event.clientY;
+                            ctx.lineWidth = 5;
+                            ctx.strokeStyle = '%s';
+                            ctx.strokeRect(x1, y1, x2-x1, y2-y1);
+                            clickNumber = 2;
+            }
+            resolve();
+            };
+        ok_btn.onclick = () => {try_again=false; 
+                                boxes.push([[x1/w, y1/h, (x2-x1)/w, (y2-y1)/h],textbox.value]);
+                                if("%s" == "True"){
+                                  tmp_div = document.getElementById("main_div");
+                                  tmp_div.remove();
+                                }
+                                resolve();
+                                };
+        add_btn.onclick = () => {
+                                if (clickNumber==2){
+                                boxes.push([[x1/w, y1/h, (x2-x1)/w, (y2-y1)/h],textbox.value]);
+                                clickNumber = 0;
+                                }
+                                resolve();
+                                };
+        clr_btn.onclick = () => { 
+                                 ctx.clearRect(0, 0, canvas.width, canvas.height); 
+                                 boxes = new Array();
+                                 clickNumber = 0;
+                                 resolve();
+                                 };
+        });
+      
+      }
+      
+      return boxes;
+    }
+    """ % (line_color,str(deleteAfter))
+  
+  imageBuffer = BytesIO()
+
+  if type(inputImg) == str:
+    img = Image.open(inputImg)
+    w,h = img.size
+    img.save(imageBuffer, format=imgformat)
+  elif type(inputImg) == np.ndarray:
+    img = Image.fromarray(inputImg)
+    w,h = img.size
+    img.save(imageBuffer, format=imgformat)
+  elif "PIL" in str(type(inputImg)):
+    w,h,_ = inputImg.size
+    inputImg.save(imageBuffer, format=imgformat)
+
+  imgBase64 = b64encode(imageBuffer.getvalue())
+  if imgformat == 'PNG':
+    str_data = "data:image/png;base64," + imgBase64.decode(encoding="utf-8")
+  elif imgformat == 'JPEG' or imgformat == 'JPG':
+    str_data = "data:image/jpeg;base64," + imgBase64.decode(encoding="utf-8")
+  elif imgformat == 'GIF':
+    str_data = "data:image/gif;base64," + imgBase64.decode(encoding="utf-8")
+  else:
+    raise "Wrong image format!"
+
+  HTML_SRC = f"""
+  <div id="main_div" style="padding:0; margin:0; border:0; height:{h*scale+50}px; width:{w*scale}px;">
+  <div id="image_div" style="padding:0; margin:0; border:0; height:{h*scale}px; width:{w*scale}px; position:absolute; top:0px; left:0px;">
+  <img id="inputImage" src="{str_data}" style="padding:0; margin:0; border:0; position:absolute; top:0px; left:0px;" height={h*scale}px; width={w*scale}px;/>
+  </div>
+  <div id="interface_div" style="padding:0; margin:0; border:0; position:absolute; top:{h*scale}px; left:0px;"></div>
+  </div>
+  """
+  display_html(HTML_SRC)
+  display_js(JS_SRC)
+  data = eval_js(f'label_image({float(scale)})')
+  return data
+
+
+def showAnnotations(img, annotations, color="green", line_width=2):
+  """Draw the annotations generated by labelImage on the input image.
+  """
+
+  if type(img) == str:
+    img = Image.open(img)
+  elif type(img) == np.ndarray:
+    img = Image.fromarray(img)
+  elif "PIL" in str(type(img)):
+    img = img.copy()
+  else:
+    ValueError("Image format not recognized!")
+  
+  w,h = img.size
+  draw = ImageDraw.Draw(img)
+  for annotation in annotations:
+    text = annotation[1]
+    annotation = annotation[0]
+    draw.rectangle([annotation[0]*w, annotation[1]*h, (annotation[0]+annotation[2])*w, (annotation[1]+annotation[3])*h], fill=None, outline=color, width=line_width)
+    draw.text((min((annotation[0],annotation[0]+annotation[2]))*w+2, min((annotation[1],annotation[1]+annotation[3]))*h+2), str(text), fill=color)
+  
+  return img
+
+
+def copy2clipboard(inputFile):
+  """Opens a file or URL and copies the content to the clipboard.
+  """
+
+  js1 = """
+  const tmp_div = document.createElement('div');
+  const tmp_button = document.createElement('button');
+  tmp_button.textContent = 'Copy2Clipboard';
+  document.body.appendChild(tmp_div);
+  tmp_div.appendChild(tmp_button);
+  const inputTXT = atob("%s");
+  const el = document.createElement('textarea');
+  el.style.position = 'absolute';
+  el.style.left = '-9999px';
+  el.value = inputTXT;
+  tmp_div.appendChild(el);
+
+
+  async function copy2clipboard(){
+    tmp_button.focus();
+    await new Promise((resolve) => tmp_button.onclick = resolve);
+    el.select();
+    el.focus();
+    document.execCommand('copy');
+    el.remove()
+    tmp_div.remove();
+  }"""
+
+  try:
+    with open(inputFile, 'r') as file:
+        data = file.read()
+        data = b64encode(bytes(data, 'utf-8')).decode("utf-8")
+  except FileNotFoundError:
+      import requests
+      try:
+          request = requests.get(inputFile)
+          data = request.text
+          data = b64encode(bytes(data, 'utf-8')).decode("utf-8")
+      except (ConnectionError, requests.exceptions.MissingSchema) as e: 
+          print('File / URL site does not exist')
+          print(e)
+          
+  display_js(js1 % data)
+  display_js("copy2clipboard()")
+
+
+def imshow(inputImg, imgformat=None, windowName="imwrite", width=None, height=None, quality=80,
+           stats=None, overlay=False):
+  """Shows an image using the same named window.
+
+  The window is created (HTML + JS) only the first time a name is used inside a cell,
+  the following calls only push the new image to it (see ImageWindow and ImageEncoder
+  for imgformat and quality, stats and overlay).
+  """
+  window = _windows.get(windowName)
+  if window is None or not window.is_alive():
+    window = _windows[windowName] = ImageWindow(windowName, width, height, imgformat, quality, stats, overlay)
+  window.show(inputImg, imgformat, quality)
+
+
+class ImageEncoder:
+  """Encodes images into data URLs for ImageWindow.
+
+  imgformat=None picks JPEG for numpy arrays and PIL images (PNG when they have an alpha channel),
+  while image files already in a format browsers understand are sent without re-encoding.
+  Images bigger than size=(width, height) are downscaled before encoding, the output buffer is reused
+  between calls and encode returns None when the image is identical to the previous one.
+  """
+
+  MIME = {'PNG': 'image/png', 'JPEG': 'image/jpeg', 'JPG': 'image/jpeg', 'GIF': 'image/gif', 'WEBP': 'image/webp'}
+
+  def __init__(self, imgformat=None, quality=80, size=None):
+    self.imgformat = imgformat
+    self.quality = quality
+    self.size = size
+    self.buffer = BytesIO()
+    self._last = None
+    self._last_file = None
+
+  def encode(self, inputImg, imgformat=None, quality=None):
+    imgformat = (imgformat or self.imgformat or "").upper()
+    quality = quality or self.quality
+    if imgformat and imgformat not in self.MIME:
+      raise ValueError("Wrong image format!")
+
+    if type(inputImg) == str:
+      key = (inputImg, getmtime(inputImg))
+      if key == self._last_file:
+        return None
+      self._last_file = key
+      self._last = None
+      img = Image.open(inputImg)
+      if img.format in self.MIME and (imgformat in ("", img.format)) and self._target_size(img.size) is None:
+        with open(inputImg, "rb") as file:
+          return self._dataurl(img.format, file.read())
+    else:
+      frame = np.asarray(inputImg)
+      if self._unchanged(frame):
+        return None
+      self._last_file = None
+      img = Image.fromarray(frame) if type(inputImg) == np.ndarray else inputImg
+
+    if not imgformat:
+      imgformat = 'PNG' if img.mode in ('RGBA', 'LA', 'P') else 'JPEG'
+    if imgformat in ('JPEG', 'JPG'):
+      imgformat = 'JPEG'
+      if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+
+    target_size = self._target_size(img.size)
+    if target_size is not None:
+      img = img.resize(target_size, Image.BILINEAR)
+
+    self.buffer.seek(0)
+    self.buffer.truncate()
+    if imgformat == 'PNG':
+      img.save(self.buffer, format=imgformat, compress_level=1)
+    elif imgformat == 'GIF':
+      img.save(self.buffer, format=imgformat, save_all=getattr(img, "is_animated", False))
+    else:
+      img.save(self.buffer, format=imgformat, quality=quality)
+    with self.buffer.getbuffer() as view:
+      return self._dataurl(imgformat, view)
+
+  def _dataurl(self, imgformat, binary):
+    return "data:%s;base64,%s" % (self.MIME[imgformat], b64encode(binary).decode("ascii"))
+
+  def _unchanged(self, frame):
+    if self._last is not None and self._last.shape == frame.shape and self._last.dtype == frame.dtype:
+      if np.array_equal(self._last, frame):
+        return True
+      np.copyto(self._last, frame)
+    else:
+      self._last = frame.copy()
+    return False
+
+  def _target_size(self, img_size):
+    """Size the image should be scaled down to so it fits inside self.size, None if it already fits.
+    """
+    if not self.size:
+      return None
+    w, h = img_size
+    max_w, max_h = self.size
+    scale = min(max_w/w if type(max_w) == int else 1.0, max_h/h if type(max_h) == int else 1.0)
+    if scale >= 1.0:
+      return None
+    return (max(1, round(w*scale)), max(1, round(h*scale)))
+
+
+class ImageWindow:
+  """Named window that shows images inside the output of the current cell.
+
+  The HTML element and the JS used to update it are injected only once, when the window is created,
+  and each call to show sends the new image through a single eval_js call that doesn't wait for
+  the browser nor adds anything to the cell output. Images are encoded by an ImageEncoder that
+  downscales them to the window width/height and skips frames identical to the last one shown.
+  stats (a TimingStats) records the time spent encoding (display_encode) and sending (display) each image
+  and overlay=True shows its FPS / median stage times on top of the image (updated twice per second).
+
+  Usage example:
+    win = ImageWindow("webcam")
+    for i in range(100):
+      win.show(vid(0))
+  """
+
+  HTML_SRC = """
+  <div id="%s_div" %s>
+  <img id="%s" %s/>%s<br>
+  </div>
+
+  <script>
+  function colab_utils_imwrite(windowName, newSRC, overlayText) {
+    var image  = document.getElementById(windowName);
+    if (typeof(image) != 'undefined' && image != null){
+      image.src = newSRC;
+    }
+    var overlay = document.getElementById(windowName + "_overlay");
+    if (overlayText !== undefined && overlay != null){
+      overlay.textContent = overlayText;
+    }
+  }
+  </script>
+  """
+
+  OVERLAY_HTML = """
+  <div id="%s_overlay" style="position:absolute; top:0; left:0; padding:2px 4px;
+  font:12px monospace; color:#0f0; background:rgba(0,0,0,0.6)"></div>"""
+
+  def __init__(self, windowName="imwrite", width=None, height=None, imgformat=None, quality=80,
+               stats=None, overlay=False):
+    self.windowName = windowName
+    self.encoder = ImageEncoder(imgformat, quality, (width, height) if width or height else None)
+    self.stats = stats
+    self.overlay = overlay and stats is not None
+    self._overlay_time = 0
+    attrs = ""
+    if width:
+      attrs += 'width="%s" ' % str(width)
+    if height:
+      attrs += 'height="%s" ' % str(height)
+    if self.overlay:
+      container, overlay_html = 'style="position:relative; display:inline-block"', self.OVERLAY_HTML % windowName
+    else:
+      container, overlay_html = "", ""
+    display_html(self.HTML_SRC % (windowName, container, windowName, attrs, overlay_html))
+    self.cell = _execution_count()
+
+  def is_alive(self):
+    """Colab isolates the output of each cell, so a window only exists inside the cell that created it.
+    """
+    return self.cell == _execution_count()
+
+  def show(self, inputImg, imgformat=None, quality=None):
+    if self.stats is not None:
+      return self._timed_show(inputImg, imgformat, quality)
+    str_data = self.encoder.encode(inputImg, imgformat, quality)
+    if str_data is None:
+      return
+    # data URLs are plain base64, no need to escape them
+    eval_js("colab_utils_imwrite(%s, '%s')" % (json.dumps(self.windowName), str_data), ignore_result=True)
+
+  def _timed_show(self, inputImg, imgformat, quality):
+    start = perf_counter()
+    str_data = self.encoder.encode(inputImg, imgformat, quality)
+    encoded = perf_counter()
+    self.stats.record('display_encode', encoded - start)
+    if str_data is None:
+      return
+    overlay = ""
+    if self.overlay and encoded - self._overlay_time >= 0.5:
+      self._overlay_time = encoded
+      overlay = ", " + json.dumps(self.stats.overlay_text())
+    eval_js("colab_utils_imwrite(%s, '%s'%s)" % (json.dumps(self.windowName), str_data, overlay), ignore_result=True)
+    self.stats.record('display', perf_counter() - encoded)
+
+  async def ashow(self, inputImg, imgformat=None, quality=None):
+    """Awaitable show: encoding and sending run in the bridge thread (see run_in_bridge)"""
+    await run_in_bridge(self.show, inputImg, imgformat, quality)
+
+
+_windows = {}
+
+
+def _execution_count():
+  return execution_count()
@@ -0,0 +1,95 @@
+"""Concurrent capture -> inference -> display loop (asyncio)"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from inspect import iscoroutinefunction
+from time import perf_counter
+
+from ._bridge import run_in_bridge
+
+
+_DONE = object()
+
+# ms the capture waits for frames while an output is on its way to the window (see run_pipeline)
+_SHOW_POLL = 20
+
+
+async def run_pipeline(grabber, model, window=None, max_frames=None, n=4, timeout=1000, queue_size=2, stats=None):
+  """Runs the webcam capture, model(frame) and the display of its output as concurrent stages
+  connected by queues of queue_size items, so the throughput is limited by the slowest stage
+  instead of the sum of all of them.
+
+  grabber is a VideoGrabber (frames are pulled n at a time, as with aread), model a function (it runs in
+  its own thread, overlapping with the capture and display that run in the bridge thread) or a coroutine
+  function, and window an ImageWindow, the name of a new one or None (the output is not shown).
+  The output of model is shown only when it's not None. The capture stops after max_frames frames
+  (None means until vid.stop() / vid.astop() is called) and the number of frames processed is returned.
+  stats (a TimingStats) records the time spent by model as 'inference'.
+  The capture and the display share the bridge thread and a read holds it until frames arrive (up to
+  timeout ms), so while a frame is being processed or shown the capture waits at most 20 ms
+  at a time, letting the display through.
+
+  Usage example (top-level await works inside a notebook cell):
+    vid = videoGrabber(fps=30)
+    await run_pipeline(vid, lambda img: detect(np.asarray(img)), "output", max_frames=300)
+    await vid.astop()
+  """
+  if isinstance(window, str):
+    from .display import ImageWindow
+    window = await run_in_bridge(ImageWindow, window)
+  frames = asyncio.Queue(queue_size)
+  outputs = asyncio.Queue(queue_size)
+  executor = None if iscoroutinefunction(model) else ThreadPoolExecutor(max_workers=1)
+  loop = asyncio.get_running_loop()
+  in_flight = 0 # frames captured and not shown yet
+
+  async def capture():
+    nonlocal in_flight
+    count = 0
+    if not grabber.streaming:
+      await run_in_bridge(grabber.start)
+    while grabber.streaming and (max_frames is None or count < max_frames):
+      wait = min(timeout, _SHOW_POLL) if window is not None and in_flight else timeout
+      for item in await run_in_bridge(grabber._read_streaming, n, wait):
+        if max_frames is not None and count >= max_frames:
+          break
+        in_flight += 1
+        await frames.put(item)
+        count += 1
+    await frames.put(_DONE)
+
+  async def infer():
+    while True:
+      item = await frames.get()
+      if item is _DONE:
+        break
+      start = perf_counter()
+      if executor is None:
+        output = await model(item[0])
+      else:
+        output = await loop.run_in_executor(executor, model, item[0])
+      if stats is not None:
+        stats.record('inference', perf_counter() - start)
+      await outputs.put(output)
+    await outputs.put(_DONE)
+
+  async def show():
+    nonlocal in_flight
+    count = 0
+    while True:
+      output = await outputs.get()
+      if output is _DONE:
+        return count
+      if window is not None and output is not None:
+        await window.ashow(output)
+      in_flight -= 1
+      count += 1
+
+  tasks = [asyncio.ensure_future(stage()) for stage in (capture, infer, show)]
+  try:
+    return (await asyncio.gather(*tasks))[-1]
+  finally:
+    for task in tasks:
+      task.cancel()
+    if executor is not None:
+      executor.shutdown(wait=False)
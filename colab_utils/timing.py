@@ -0,0 +1,129 @@
+"""Per-stage timing of the capture -> inference -> display loop"""
+
+from time import perf_counter
+
+import numpy as np
+
+
+class TimingStats:
+  """Rolling timings (the last `window` frames) of each stage of a webcam loop.
+
+  Nothing is measured unless a TimingStats is passed (stats=...) to videoGrabber, imshow or ImageWindow.
+  They record these stages for each frame:
+    sleep           browser: waiting ms before grabbing the frame (vid(ms))
+    encode          browser: drawing the video into the canvas and encoding it (toDataURL / raw bytes)
+    buffer          browser: time the frame waited in the stream buffer (vid.read / vid.frames)
+    transfer        eval_js round trip without the time spent by the browser in the stages above
+    decode          b64decode + Image.open (or np.frombuffer for raw frames)
+    display_encode  ImageEncoder turning the image shown into a data URL
+    display         eval_js call sending the image to the window
+  Other stages (e.g. inference) can be timed with stats.timer(stage) or stats.record(stage, seconds).
+  The values are kept in fixed size numpy ring buffers, so recording costs about a microsecond.
+
+  Usage example:
+    stats = TimingStats()
+    vid = videoGrabber(stats=stats)
+    for frame, timestamp in vid.frames():
+      with stats.timer('inference'):
+        output = model(frame)
+      imshow(output, stats=stats, overlay=True)
+    print(stats)
+  """
+
+  def __init__(self, window=300):
+    self.window = window
+    self._stages = {}
+
+  def record(self, stage, seconds):
+    ring = self._stages.get(stage)
+    if ring is None:
+      ring = self._stages[stage] = _Ring(self.window)
+    ring.add(seconds, perf_counter())
+
+  def timer(self, stage):
+    """Context manager recording the time spent inside the with block as stage"""
+    return _Timer(self, stage)
+
+  def stages(self):
+    return list(self._stages)
+
+  def values(self, stage):
+    """Last (up to window) durations of stage in seconds"""
+    return self._stages[stage].values()
+
+  def fps(self, stage=None):
+    """Frames per second at stage (by default, the last stage of the loop that was recorded)"""
+    if stage is None:
+      stage = next((s for s in ('display', 'decode') if s in self._stages), None)
+    ring = self._stages.get(stage)
+    if ring is None:
+      return 0.0
+    ends = ring.ends()
+    if len(ends) < 2:
+      return 0.0
+    return (len(ends) - 1)/(ends.max() - ends.min())
+
+  def histogram(self, stage, bins=20):
+    """Histogram (counts, bin edges in ms) of the last durations of stage"""
+    return np.histogram(self.values(stage)*1000, bins=bins)
+
+  def summary(self):
+    """{stage: {count, mean_ms, p50_ms, p90_ms, p99_ms, max_ms}}"""
+    summary = {}
+    for stage, ring in self._stages.items():
+      values = ring.values()*1000
+      p50, p90, p99 = np.percentile(values, [50, 90, 99])
+      summary[stage] = {'count': ring.count, 'mean_ms': values.mean(), 'p50_ms': p50, 'p90_ms': p90,
+                        'p99_ms': p99, 'max_ms': values.max()}
+    return summary
+
+  def overlay_text(self):
+    """One line with the FPS and the median of each stage, as shown by ImageWindow(overlay=True)"""
+    stages = " | ".join("%s %.1f" % (stage, np.median(ring.values())*1000) for stage, ring in self._stages.items())
+    return "%.1f FPS | %s ms" % (self.fps(), stages)
+
+  def reset(self):
+    self._stages = {}
+
+  def __str__(self):
+    lines = ["%.1f FPS" % self.fps(),
+             "%-15s %7s %9s %9s %9s %9s" % ("stage", "count", "mean ms", "p50 ms", "p90 ms", "p99 ms")]
+    for stage, s in self.summary().items():
+      lines.append("%-15s %7d %9.2f %9.2f %9.2f %9.2f" % (stage, s['count'], s['mean_ms'], s['p50_ms'], s['p90_ms'], s['p99_ms']))
+    return "\n".join(lines)
+
+
+class _Ring:
+  __slots__ = ('durations', 'end_times', 'count')
+
+  def __init__(self, size):
+    self.durations = np.zeros(size)
+    self.end_times = np.zeros(size)
+    self.count = 0
+
+  def add(self, seconds, end):
+    i = self.count % len(self.durations)
+    self.durations[i] = seconds
+    self.end_times[i] = end
+    self.count += 1
+
+  def values(self):
+    return self.durations[:self.count]
+
+  def ends(self):
+    return self.end_times[:self.count]
+
+
+class _Timer:
+  __slots__ = ('stats', 'stage', 'start')
+
+  def __init__(self, stats, stage):
+    self.stats = stats
+    self.stage = stage
+
+  def __enter__(self):
+    self.start = perf_counter()
+    return self
+
+  def __exit__(self, *exc):
+    self.stats.record(self.stage, perf_counter() - self.start)
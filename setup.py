@@ -4,6 +4,7 @@ setup(
     version="0.2",
     packages=['colab_utils'],
     install_requires=['ffmpeg-python', 'scipy', 'pillow', 'numpy'],
+    extras_require={'stream': ['ijson']},
 
     # metadata to display on PyPI
     author="Ricardo de Azambuja",
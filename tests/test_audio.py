@@ -0,0 +1,75 @@
+from base64 import b64encode
+from io import BytesIO
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+from colab_utils import Bridge, set_bridge, getAudio
+from colab_utils import audio
+
+pytest.importorskip("ffmpeg")
+pytest.importorskip("scipy")
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs the ffmpeg binary")
+
+
+class RecordingBridge(Bridge):
+  """Answers getAudio's eval_js("data") with a WAV recording"""
+
+  def __init__(self, samples, sample_rate):
+    from scipy.io.wavfile import write
+    wav = BytesIO()
+    write(wav, sample_rate, samples)
+    self.dataurl = "data:audio/wav;base64," + b64encode(wav.getvalue()).decode()
+
+  def eval_js(self, script, ignore_result=False):
+    return self.dataurl
+
+  def display_html(self, src, display_id=None):
+    return None
+
+
+@pytest.fixture
+def recording():
+  sample_rate = 16000
+  samples = (0.5*np.sin(2*np.pi*440*np.arange(sample_rate//2)/sample_rate)).astype(np.float32)
+  previous = set_bridge(RecordingBridge(samples, sample_rate))
+  yield samples, sample_rate
+  set_bridge(previous)
+
+
+@pytest.fixture
+def processes(monkeypatch):
+  started = []
+
+  class Popen(subprocess.Popen):
+    def __init__(self, *args, **kwargs):
+      super().__init__(*args, **kwargs)
+      started.append(self)
+
+  monkeypatch.setattr(audio.subprocess, "Popen", Popen)
+  return started
+
+
+def test_getAudio_pcm_format_leaves_no_process_running(recording, processes):
+  samples, sample_rate = recording
+  for _ in range(3):
+    decoded, sr = getAudio(pcm_format='f32le', sample_rate=sample_rate)
+    assert sr == sample_rate
+    assert np.allclose(decoded, samples, atol=1e-4)
+  assert len(processes) == 3
+  assert all(p.poll() is not None for p in processes)
+
+
+def test_getAudio_reuses_the_decoder_passed(recording, processes):
+  samples, sample_rate = recording
+  decoder = audio.PCMDecoder(sample_rate, 1, 's16le')
+  try:
+    for _ in range(2):
+      decoded, sr = getAudio(decoder=decoder)
+      assert decoded.dtype == np.int16 and len(decoded) == len(samples)
+    # the decoder keeps one process ready for the next recording
+    assert sum(p.poll() is None for p in processes) == 1
+  finally:
+    decoder.close()
@@ -0,0 +1,180 @@
+import numpy as np
+from PIL import Image
+
+from colab_utils import augment_dataset, augment_generator, rnd_translate, rnd_translate_matrix, transform_boxes, FLIP, MIRROR
+
+
+def make_csv(tmp_path, rows, size=(64, 48)):
+  """Writes one random image per distinct name in rows [(name, label, x_min, y_min, x_max, y_max)] and the CSV"""
+  rnd = np.random.RandomState(0)
+  lines = []
+  for name, label, x_min, y_min, x_max, y_max in rows:
+    path = tmp_path / name
+    if not path.exists():
+      Image.fromarray(rnd.randint(0, 256, (size[1], size[0], 3), dtype=np.uint8)).save(path)
+    lines.append(f"TRAIN,{path},{label},{x_min},{y_min},,,{x_max},{y_max},,\n")
+  csvfilename = tmp_path / "dataset.csv"
+  csvfilename.write_text("".join(lines))
+  return csvfilename
+
+
+def read_rows(csvfilename):
+  return [line.split(',') for line in csvfilename.read_text().splitlines()]
+
+
+def n_variants(increaseby):
+  # flip, mirror, flip-mirror and increaseby translations, each with 2*increaseby photometric variants
+  return (3 + increaseby)*(1 + 2*increaseby)
+
+
+def test_transform_boxes_single_and_array():
+  box = [0.1, 0.2, 0.4, 0.6]
+  assert np.allclose(transform_boxes(box, FLIP), [0.1, 0.4, 0.4, 0.8])
+  assert np.allclose(transform_boxes(box, MIRROR), [0.6, 0.2, 0.9, 0.6])
+  boxes = transform_boxes(np.array([box, [0.5, 0.5, 1.0, 1.0]]), MIRROR @ FLIP)
+  assert boxes.shape == (2, 4)
+  assert np.allclose(boxes, [[0.6, 0.4, 0.9, 0.8], [0.0, 0.0, 0.5, 0.5]])
+
+
+def test_rnd_translate_keeps_boxes_inside():
+  img = Image.new('RGB', (100, 80))
+  boxes = np.array([[0.1, 0.2, 0.3, 0.4], [0.5, 0.1, 0.7, 0.6]])
+  for seed in range(20):
+    _, boxes_aug = rnd_translate(img, boxes, seed)
+    assert boxes_aug.min() >= 0 and boxes_aug.max() <= 1
+    # all the boxes of the image move together
+    assert np.allclose(boxes_aug - boxes, (boxes_aug - boxes)[0])
+
+
+def test_augment_dataset_groups_boxes_by_image(tmp_path):
+  csvfilename = make_csv(tmp_path, [("a.png", "cat", 0.1, 0.1, 0.3, 0.4),
+                                    ("a.png", "dog", 0.5, 0.5, 0.8, 0.9),
+                                    ("b.png", "cat", 0.2, 0.2, 0.6, 0.6)])
+  augment_dataset(str(csvfilename), increaseby=1)
+  rows = read_rows(csvfilename)
+  assert len(rows) == 3 + 3*n_variants(1)
+
+  per_file = {}
+  for r in rows[3:]:
+    per_file.setdefault(r[1], []).append(r[2])
+  assert len(per_file) == 2*n_variants(1)
+  for path, labels in per_file.items():
+    assert (tmp_path / path).exists()
+    assert labels == (["cat", "dog"] if "/a_" in path else ["cat"])
+
+
+def test_augment_dataset_workers_give_the_same_rows(tmp_path):
+  rows = [("a.png", "cat", 0.1, 0.1, 0.3, 0.4), ("b.png", "dog", 0.2, 0.2, 0.6, 0.6)]
+  (tmp_path / "serial").mkdir()
+  (tmp_path / "pool").mkdir()
+  serial = make_csv(tmp_path / "serial", rows)
+  pool = make_csv(tmp_path / "pool", rows)
+  augment_dataset(str(serial), increaseby=1)
+  augment_dataset(str(pool), increaseby=1, workers=2, chunksize=1)
+  strip = lambda rows, d: [[v.replace(str(d), "") for v in r] for r in rows]
+  assert strip(read_rows(serial), tmp_path / "serial") == strip(read_rows(pool), tmp_path / "pool")
+
+
+def test_augment_dataset_boxes_touching_both_edges(tmp_path):
+  # the box enclosing all the boxes of the image leaves no room to translate horizontally
+  csvfilename = make_csv(tmp_path, [("a.png", "cat", 0.0, 0.2, 0.3, 0.5),
+                                    ("a.png", "dog", 0.7, 0.3, 1.0, 0.6)])
+  augment_dataset(str(csvfilename), increaseby=2)
+  rows = read_rows(csvfilename)
+  assert len(rows) == 2 + 2*n_variants(2)
+  for r in rows:
+    assert 0 <= float(r[3]) <= float(r[7]) <= 1
+    assert 0 <= float(r[4]) <= float(r[8]) <= 1
+
+
+def test_rnd_translate_matrix_without_room_to_move():
+  boxes = np.array([[0.0, 0.0, 0.3, 0.3], [0.7, 0.7, 1.0, 1.0]])
+  for seed in range(5):
+    assert np.allclose(rnd_translate_matrix((64, 48), boxes, seed), np.eye(3))
+
+
+def test_rnd_translate_single_wide_box():
+  img = Image.new('RGB', (100, 80))
+  box = [0.001, 0.1, 0.999, 0.5]
+  img_aug, box_aug = rnd_translate(img, box)
+  assert isinstance(box_aug, list)
+  assert img_aug.size == img.size
+  assert np.allclose([box_aug[0], box_aug[2]], [box[0], box[2]])
+  assert 0 <= box_aug[1] and box_aug[3] <= 1
+  M = rnd_translate_matrix((100, 80), box)
+  assert M[0, 2] == 0
+
+
+def generated(csvfilename, **kwargs):
+  """All the samples (image, boxes, labels) yielded by augment_generator, batch by batch"""
+  samples, sizes = [], []
+  for images, boxes, labels in augment_generator(str(csvfilename), **kwargs):
+    sizes.append(len(images))
+    samples += list(zip(images, boxes, labels))
+  return samples, sizes
+
+
+GENERATOR_ROWS = [("a.png", "cat", 0.1, 0.1, 0.3, 0.4), ("a.png", "dog", 0.5, 0.5, 0.8, 0.9),
+                  ("b.png", "cat", 0.2, 0.2, 0.6, 0.6), ("c.png", "dog", 0.3, 0.1, 0.5, 0.7)]
+
+
+def test_augment_generator_batches(tmp_path):
+  csvfilename = make_csv(tmp_path, GENERATOR_ROWS)
+  samples, sizes = generated(csvfilename, batch_size=5, increaseby=1, epochs=2)
+  assert len(samples) == 2*3*(1 + n_variants(1))
+  assert sizes[:-1] == [5]*(len(sizes)-1) and 0 < sizes[-1] <= 5
+  image, boxes, labels = samples[0]
+  assert image.shape == (48, 64, 3)
+  assert boxes.shape == (2, 4) and labels.tolist() == ["cat", "dog"]
+
+
+def test_augment_generator_first_epoch_matches_augment_dataset(tmp_path):
+  csvfilename = make_csv(tmp_path, [("a.png", "cat", 0.1, 0.1, 0.3, 0.4), ("b.png", "dog", 0.2, 0.2, 0.6, 0.6)])
+  samples, _ = generated(csvfilename, increaseby=1, include_original=False)
+  augment_dataset(str(csvfilename), increaseby=1)
+  rows = read_rows(csvfilename)[2:]
+  assert len(samples) == len(rows)
+  for (image, boxes, _), r in zip(samples, rows):
+    assert np.array_equal(image, np.asarray(Image.open(r[1])))
+    assert np.allclose(boxes[0], [float(r[3]), float(r[4]), float(r[7]), float(r[8])], atol=0.005)
+
+
+def test_augment_generator_epochs_draw_new_augmentations(tmp_path):
+  csvfilename = make_csv(tmp_path, GENERATOR_ROWS)
+  per_epoch = 3*n_variants(1)
+  for fixed in (False, True):
+    samples, _ = generated(csvfilename, increaseby=1, epochs=2, include_original=False, fixed=fixed)
+    same = [np.array_equal(a[0], b[0]) for a, b in zip(samples[:per_epoch], samples[per_epoch:])]
+    assert all(same) if fixed else not all(same)
+
+
+def test_augment_generator_shuffle(tmp_path):
+  csvfilename = make_csv(tmp_path, GENERATOR_ROWS)
+  originals = lambda samples: [s[0] for s in samples[::1 + n_variants(1)]]
+  ordered, _ = generated(csvfilename, increaseby=1)
+  shuffled, _ = generated(csvfilename, increaseby=1, shuffle=True, seed=1)
+  again, _ = generated(csvfilename, increaseby=1, shuffle=True, seed=1)
+  assert all(np.array_equal(a[0], b[0]) for a, b in zip(shuffled, again))
+  key = lambda image: image.tobytes()
+  assert sorted(map(key, originals(ordered))) == sorted(map(key, originals(shuffled)))
+  assert list(map(key, originals(ordered))) != list(map(key, originals(shuffled)))
+
+
+def test_augment_generator_prefetch_gives_the_same_samples(tmp_path):
+  csvfilename = make_csv(tmp_path, GENERATOR_ROWS)
+  serial, _ = generated(csvfilename, increaseby=1, epochs=2, shuffle=True)
+  threaded, _ = generated(csvfilename, increaseby=1, epochs=2, shuffle=True, workers=2, prefetch=1)
+  assert len(serial) == len(threaded)
+  for a, b in zip(serial, threaded):
+    assert np.array_equal(a[0], b[0]) and np.array_equal(a[1], b[1]) and list(a[2]) == list(b[2])
+
+
+def test_augment_dataset_csv_without_trailing_newline(tmp_path):
+  csvfilename = make_csv(tmp_path, [("a.png", "cat", 0.1, 0.1, 0.3, 0.4)])
+  original = csvfilename.read_text().rstrip("\n")
+  csvfilename.write_text(original)
+  augment_dataset(str(csvfilename), increaseby=1)
+  rows = read_rows(csvfilename)
+  assert len(rows) == 1 + n_variants(1)
+  assert ",".join(rows[0]) == original
+  assert all(len(r) == 11 for r in rows)
@@ -0,0 +1,61 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "benchmarks"))
+from fake_bridge import FakeBridge
+
+from colab_utils import set_bridge, webcam2numpy, videoGrabber
+
+
+@pytest.fixture
+def bridge():
+  bridge = FakeBridge(latency=0, camera_size=(64, 48), n_frames=1)
+  previous = set_bridge(bridge)
+  yield bridge
+  set_bridge(previous)
+
+
+def test_raw_gray_matches_the_luma_of_the_rgb_frame(bridge):
+  rgb = np.asarray(webcam2numpy(size=(64, 48), transport='raw'))
+  gray = np.asarray(webcam2numpy(size=(64, 48), transport='raw', gray=True))
+  expected = (rgb.astype(np.uint16) @ np.array([77, 150, 29], dtype=np.uint16)) >> 8
+  assert gray.shape == (48, 64)
+  assert np.array_equal(gray, expected)
+  assert gray.max() > 200
+
+
+@pytest.mark.parametrize("transport", ['jpeg', 'png', 'raw'])
+def test_transports_give_the_same_frame(bridge, transport):
+  raw = np.asarray(webcam2numpy(size=(64, 48), transport='raw')).astype(int)
+  frame = np.asarray(webcam2numpy(size=(64, 48), transport=transport)).astype(int)
+  assert frame.shape == raw.shape == (48, 64, 3)
+  assert np.abs(frame - raw).mean() < 8
+
+
+def test_stream_delivers_timestamped_frames(bridge):
+  vid = videoGrabber(size=(64, 48), fps=100, transport='raw', buffer_size=4)
+  frames = []
+  while len(frames) < 10:
+    frames += vid.read(n=4, timeout=200)
+  vid.stop()
+  timestamps = [t for _, t in frames]
+  assert timestamps == sorted(timestamps)
+  assert all(np.asarray(frame).shape == (48, 64, 3) for frame, _ in frames)
+
+
+def test_change_detector_skips_unchanged_frames():
+  bridge = FakeBridge(latency=0, camera_size=(64, 48), scene_every=10)
+  previous = set_bridge(bridge)
+  try:
+    vid = videoGrabber(size=(64, 48), fps=200, change_threshold=4, keepalive=None)
+    frames = []
+    while len(frames) < 3:
+      frames += vid.read(n=4, timeout=200)
+    vid.stop()
+  finally:
+    set_bridge(previous)
+  # one frame per scene, the other 9 frames of each scene are skipped in the browser
+  assert vid.skipped >= 9*(len(frames) - 1)
@@ -0,0 +1,73 @@
+import json
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from colab_utils import Dataset, cocojson2modelmakercsv, modelmakercsv2cocojson
+
+
+ROWS = [("UNASSIGNED", "imgs/a.jpg", "cat", 0.1, 0.2, 0.5, 0.6),
+        ("UNASSIGNED", "imgs/a.jpg", "dog", 0.25, 0.5, 0.75, 1.0),
+        ("UNASSIGNED", "http://host/b.jpg", "cat", 0.0, 0.0, 1.0, 0.5)]
+SIZES = {"imgs/a.jpg": (200, 100), "http://host/b.jpg": (64, 48)}
+
+
+def write_csv(filename, rows=ROWS):
+  filename.write_text("".join(f"{s},{path},{label},{x0},{y0},,,{x1},{y1},,\n" for s, path, label, x0, y0, x1, y1 in rows))
+  return str(filename)
+
+
+def test_csv_to_coco(tmp_path):
+  jsonfilename = str(tmp_path / "coco.json")
+  modelmakercsv2cocojson(write_csv(tmp_path / "dataset.csv"), jsonfilename, img_sizes=SIZES)
+  with open(jsonfilename) as f:
+    coco = json.load(f)
+  assert [(c["id"], c["name"]) for c in coco["categories"]] == [(1, "cat"), (2, "dog")]
+  assert [(i["id"], i["file_name"], i["width"], i["height"]) for i in coco["images"]] == \
+         [(1, "imgs/a.jpg", 200, 100), (2, "http://host/b.jpg", 64, 48)]
+  assert coco["images"][1]["coco_url"] == "http://host/b.jpg"
+  assert [a["image_id"] for a in coco["annotations"]] == [1, 1, 2]
+  assert np.allclose(coco["annotations"][0]["bbox"], [20, 20, 80, 40])
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_round_trip(tmp_path, stream):
+  if stream:
+    pytest.importorskip("ijson")
+  jsonfilename = str(tmp_path / "coco.json")
+  modelmakercsv2cocojson(write_csv(tmp_path / "dataset.csv"), jsonfilename, img_sizes=SIZES)
+  ds = cocojson2modelmakercsv(jsonfilename, stream=stream)
+  assert ds.paths.tolist() == [r[1] for r in ROWS]
+  assert [ds.label_names[l] for l in ds.labels.tolist()] == [r[2] for r in ROWS]
+  assert np.allclose(ds.boxes, [r[3:] for r in ROWS])
+
+  csvfilename = str(tmp_path / "back.csv")
+  cocojson2modelmakercsv(jsonfilename, csvfilename, stream=stream)
+  back = Dataset.load(csvfilename)
+  assert back.paths.tolist() == ds.paths.tolist()
+  assert np.allclose(back.boxes, ds.boxes, atol=0.005) # the CSV keeps 2 decimals
+
+
+def test_coco_ids_need_not_be_contiguous(tmp_path):
+  coco = {"categories": [{"id": 7, "name": "cat"}, {"id": 3, "name": "dog"}],
+          "images": [{"id": 42, "file_name": "a.jpg", "width": 100, "height": 50}],
+          "annotations": [{"id": 1, "image_id": 42, "category_id": 3, "bbox": [10, 5, 50, 25]},
+                          {"id": 2, "image_id": 42, "category_id": 7, "bbox": [0, 0, 100, 50]}]}
+  jsonfilename = tmp_path / "coco.json"
+  jsonfilename.write_text(json.dumps(coco))
+  ds = cocojson2modelmakercsv(str(jsonfilename), img_dir="imgs/")
+  assert ds.paths.tolist() == ["imgs/a.jpg"]*2
+  assert [ds.label_names[l] for l in ds.labels.tolist()] == ["dog", "cat"]
+  assert np.allclose(ds.boxes, [[0.1, 0.1, 0.6, 0.6], [0, 0, 1, 1]])
+
+
+def test_image_sizes_read_from_the_files(tmp_path):
+  (tmp_path / "imgs").mkdir()
+  path = str(tmp_path / "imgs" / "a.jpg")
+  Image.new('RGB', (200, 100)).save(path)
+  jsonfilename = str(tmp_path / "coco.json")
+  modelmakercsv2cocojson(write_csv(tmp_path / "dataset.csv", [("TRAIN", path, "cat", 0.1, 0.2, 0.5, 0.6)]), jsonfilename)
+  with open(jsonfilename) as f:
+    coco = json.load(f)
+  assert (coco["images"][0]["width"], coco["images"][0]["height"]) == (200, 100)
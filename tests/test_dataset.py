@@ -0,0 +1,106 @@
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from colab_utils import Dataset, saveimgslocally
+
+
+def png(color, size=(32, 24)):
+  buffer = BytesIO()
+  Image.new('RGB', size, color).save(buffer, format='PNG')
+  return buffer.getvalue()
+
+
+class FakeSession:
+  """requests.Session answering with the contents in {url: bytes} (404 for anything else)"""
+
+  def __init__(self, contents):
+    self.contents = contents
+    self.requested = []
+
+  def get(self, url, timeout=None):
+    self.requested.append(url)
+    response = type("Response", (), {})()
+    response.status_code = 200 if url in self.contents else 404
+    response.content = self.contents.get(url, b"")
+    return response
+
+
+def write_csv(filename, rows):
+  filename.write_text("".join(f"{s},{path},{label},{x0},{y0},,,{x1},{y1},,\n" for s, path, label, x0, y0, x1, y1 in rows))
+  return str(filename)
+
+
+URL_ROWS = [("TRAIN", "http://a/1.png", "cat", 0.1, 0.1, 0.5, 0.5),
+            ("TRAIN", "http://a/1.png", "dog", 0.2, 0.2, 0.6, 0.6),
+            ("TEST", "http://a/2.png", "cat", 0.3, 0.3, 0.7, 0.7),
+            ("TEST", "http://a/missing.png", "cat", 0.3, 0.3, 0.7, 0.7)]
+
+
+def test_saveimgslocally_csv_file(tmp_path):
+  csvfilename = write_csv(tmp_path / "urls.csv", URL_ROWS)
+  session = FakeSession({"http://a/1.png": png("red"), "http://a/2.png": png("blue")})
+  img_path = str(tmp_path / "imgs")
+  saveimgslocally(csvfilename, str(tmp_path / "local.csv"), img_path=img_path, session=session, retries=0)
+
+  local = Dataset.load(str(tmp_path / "local.csv"))
+  assert len(local) == 3 # the row of the missing image is dropped
+  assert local.paths[0] == local.paths[1] != local.paths[2]
+  assert np.allclose(Image.open(local.paths[2]).getpixel((0, 0)), (0, 0, 255), atol=8) # re-encoded as JPEG
+  assert sorted(set(session.requested)) == ["http://a/1.png", "http://a/2.png", "http://a/missing.png"]
+
+
+def test_saveimgslocally_csv_file_needs_newcsvfilename(tmp_path):
+  csvfilename = write_csv(tmp_path / "urls.csv", URL_ROWS)
+  session = FakeSession({})
+  with pytest.raises(ValueError):
+    saveimgslocally(csvfilename, img_path=str(tmp_path / "imgs"), session=session)
+  assert session.requested == [] # raised before downloading anything
+  assert not (tmp_path / "imgs").exists()
+
+
+def test_saveimgslocally_dataset_without_newcsvfilename(tmp_path):
+  ds = Dataset.load(write_csv(tmp_path / "urls.csv", URL_ROWS))
+  session = FakeSession({"http://a/1.png": png("red"), "http://a/2.png": png("blue")})
+  local = saveimgslocally(ds, img_path=str(tmp_path / "imgs"), session=session, retries=0)
+  assert len(local) == 3
+  assert local.label_names == ds.label_names
+  assert np.array_equal(local.boxes, ds.boxes[:3])
+
+
+def test_saveimgslocally_cache_keeps_each_size(tmp_path):
+  csvfilename = write_csv(tmp_path / "urls.csv", URL_ROWS[:3])
+  session = FakeSession({"http://a/1.png": png("red", (800, 600)), "http://a/2.png": png("blue", (800, 600))})
+  cache = str(tmp_path / "cache")
+  saveimgslocally(csvfilename, str(tmp_path / "full.csv"), cache=cache, session=session, retries=0)
+  saveimgslocally(csvfilename, str(tmp_path / "small.csv"), cache=cache, session=session, retries=0, max_side=100)
+  assert len(session.requested) == 4 # the smaller images are not the cached ones
+  full, small = Dataset.load(str(tmp_path / "full.csv")), Dataset.load(str(tmp_path / "small.csv"))
+  assert Image.open(full.paths[0]).size == (800, 600)
+  assert Image.open(small.paths[0]).size == (100, 75)
+
+  saveimgslocally(csvfilename, str(tmp_path / "again.csv"), cache=cache, session=session, retries=0, max_side=100)
+  assert len(session.requested) == 4
+  assert Dataset.load(str(tmp_path / "again.csv")).paths.tolist() == small.paths.tolist()
+
+
+def test_dataset_csv_format_matches_the_csv_writers(tmp_path):
+  from colab_utils import augment_dataset
+  Image.new('RGB', (32, 24), 'red').save(tmp_path / "a.png")
+  csvfilename = tmp_path / "dataset.csv"
+  csvfilename.write_text(f"TRAIN,{tmp_path / 'a.png'},cat,0.10,0.20,,,0.55,0.60,,\n")
+  augment_dataset(Dataset.load(str(csvfilename)), increaseby=1).save(str(tmp_path / "from_dataset.csv"))
+  augment_dataset(str(csvfilename), increaseby=1)
+  assert (tmp_path / "from_dataset.csv").read_text() == csvfilename.read_text()
+
+
+def test_distribution_shape(tmp_path):
+  from colab_utils import splitdataset
+  csvfilename = write_csv(tmp_path / "dataset.csv", [("UNASSIGNED", f"img_{i}.jpg", "cat", 0.1, 0.1, 0.5, 0.5)
+                                                     for i in range(10)])
+  ds = Dataset.load(csvfilename)
+  assert ds.distribution() == {"TRAIN": {}, "VALIDATION": {}, "TEST": {}, "UNASSIGNED": {"cat": 10}}
+  from_csv = splitdataset(csvfilename, [1, 0, 0], newcsvfilename=str(tmp_path / "split.csv"))
+  assert from_csv == splitdataset(ds, [1, 0, 0]).distribution() == {"TRAIN": {"cat": 10}, "VALIDATION": {}, "TEST": {}}
@@ -0,0 +1,100 @@
+import shutil
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from colab_utils import Dataset, dedupimages
+from colab_utils.dataset import _near_duplicates, _popcount
+
+
+def smooth_image(seed, size=(128, 96)):
+  """Random image without fine details, so its perceptual hash survives resizing and recompression"""
+  rnd = np.random.RandomState(seed)
+  small = Image.fromarray(rnd.randint(0, 256, (6, 8, 3), dtype=np.uint8))
+  return small.resize(size, Image.BICUBIC)
+
+
+def write_csv(filename, rows):
+  filename.write_text("".join(f"TRAIN,{path},{label},{x0},{y0},,,{x1},{y1},,\n" for path, label, x0, y0, x1, y1 in rows))
+  return str(filename)
+
+
+def test_exact_and_near_duplicates(tmp_path):
+  a, b, c, d = [str(tmp_path / name) for name in ("a.png", "b.png", "c.jpg", "d.png")]
+  smooth_image(0).save(a)
+  shutil.copy(a, b) # exact copy
+  smooth_image(0).resize((100, 75), Image.BILINEAR).save(c, quality=70) # resized and recompressed
+  smooth_image(1).save(d) # another image
+  csvfilename = write_csv(tmp_path / "dataset.csv", [(a, "cat", 0.1, 0.1, 0.5, 0.5),
+                                                     (b, "cat", 0.1, 0.1, 0.5, 0.5), # same box as a's
+                                                     (b, "dog", 0.6, 0.6, 0.9, 0.9),
+                                                     (c, "cat", 0.2, 0.2, 0.4, 0.4),
+                                                     (d, "cat", 0.1, 0.1, 0.5, 0.5)])
+  duplicates = dedupimages(csvfilename, str(tmp_path / "dedup.csv"))
+  assert duplicates == {b: a, c: a}
+
+  ds = Dataset.load(str(tmp_path / "dedup.csv"))
+  assert ds.paths.tolist() == [a, a, a, d]
+  assert [ds.label_names[l] for l in ds.labels.tolist()] == ["cat", "dog", "cat", "cat"]
+
+
+def test_threshold_zero_only_merges_identical_hashes(tmp_path):
+  a, c = str(tmp_path / "a.png"), str(tmp_path / "c.png")
+  img = smooth_image(0)
+  img.save(a)
+  arr = np.asarray(img).copy()
+  arr[:, :64] = 255 - arr[:, :64] # changes the left half
+  Image.fromarray(arr).save(c)
+  ds = Dataset([a, c], ["cat", "cat"], [[0.1, 0.1, 0.5, 0.5]]*2)
+  assert len(dedupimages(ds, threshold=0)) == 2
+
+
+def test_dataset_input(tmp_path):
+  a, b = str(tmp_path / "a.png"), str(tmp_path / "b.png")
+  smooth_image(0).save(a)
+  shutil.copy(a, b)
+  ds = Dataset([a, b], ["cat", "dog"], [[0.1, 0.1, 0.5, 0.5], [0.2, 0.2, 0.6, 0.6]])
+  merged = dedupimages(ds)
+  assert isinstance(merged, Dataset)
+  assert merged.paths.tolist() == [a, a]
+  assert not (tmp_path / "dataset.csv").exists()
+
+
+@pytest.mark.parametrize("block_size", [1024, 7])
+def test_near_duplicates_finds_every_close_pair(block_size):
+  rnd = np.random.RandomState(0)
+  base = rnd.randint(0, 2**63, 20, dtype=np.uint64)
+  # each base hash plus copies with a few flipped bits
+  flips = [np.uint64(1) << np.uint64(b) for b in rnd.randint(0, 64, 60)]
+  phash = np.concatenate([base, base[rnd.randint(0, 20, 60)] ^ np.array(flips, dtype=np.uint64),
+                          base[:5]])
+  for threshold in (0, 1, 3, 6, 20):
+    found = {tuple(sorted(pair)) for pair in _near_duplicates(phash, threshold, block_size)}
+    distances = _popcount(phash[:, None] ^ phash[None, :]).reshape(len(phash), len(phash))
+    # brute force, between the first occurrence of each distinct hash (and each repeated hash to its first)
+    _, first = np.unique(phash, return_index=True)
+    expected = {(i, j) for i in first.tolist() for j in first.tolist() if i < j and distances[i, j] <= threshold}
+    expected |= {tuple(sorted((int(first[np.searchsorted(np.unique(phash), phash[k])]), k)))
+                 for k in range(len(phash)) if k not in set(first.tolist())}
+    assert found == {tuple(int(v) for v in pair) for pair in expected}
+
+
+def test_unreadable_images_are_left_alone(tmp_path, capsys):
+  a, b, corrupt = str(tmp_path / "a.png"), str(tmp_path / "b.png"), str(tmp_path / "corrupt.png")
+  smooth_image(0).save(a)
+  shutil.copy(a, b)
+  (tmp_path / "corrupt.png").write_bytes(b"not an image")
+  missing = str(tmp_path / "missing.png")
+  ds = Dataset([missing, a, corrupt, b], ["cat"]*4, [[0.1, 0.1, 0.5, 0.5]]*4)
+  merged = dedupimages(ds)
+  assert merged.paths.tolist() == [missing, a, corrupt]
+  out = capsys.readouterr().out
+  assert missing in out and corrupt in out
+
+
+def test_threshold_is_validated(tmp_path):
+  ds = Dataset([], [], np.zeros((0, 4)))
+  with pytest.raises(ValueError):
+    dedupimages(ds, threshold=64)
+  assert len(dedupimages(ds, threshold=63)) == 0
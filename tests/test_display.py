@@ -0,0 +1,122 @@
+from base64 import b64decode, b64encode
+from io import BytesIO
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "benchmarks"))
+from fake_bridge import FakeBridge
+
+from colab_utils import set_bridge, imshow, ImageEncoder, ImageWindow, TimingStats
+
+
+class RecordingBridge(FakeBridge):
+  """FakeBridge keeping the HTML it was asked to display"""
+
+  def __init__(self, **kwargs):
+    super().__init__(latency=0, **kwargs)
+    self.html = []
+
+  def display_html(self, src, display_id=None):
+    self.html.append(src)
+    return super().display_html(src, display_id)
+
+
+@pytest.fixture
+def bridge():
+  bridge = RecordingBridge()
+  previous = set_bridge(bridge)
+  yield bridge
+  set_bridge(previous)
+
+
+def decode(dataurl):
+  header, data = dataurl.split(",", 1)
+  return header, Image.open(BytesIO(b64decode(data)))
+
+
+def frame(value=0, size=(80, 60)):
+  return np.full((size[1], size[0], 3), value, dtype=np.uint8)
+
+
+def test_encoder_skips_unchanged_frames():
+  encoder = ImageEncoder()
+  img = frame(10)
+  assert encoder.encode(img) is not None
+  assert encoder.encode(img) is None
+  assert encoder.encode(img.copy()) is None # same pixels, another array
+  img[0, 0] = 255
+  assert encoder.encode(img) is not None
+  assert encoder.encode(frame(10, (40, 30))) is not None # another size
+
+
+def test_encoder_formats():
+  encoder = ImageEncoder()
+  header, img = decode(encoder.encode(frame(10)))
+  assert header == "data:image/jpeg;base64" and img.size == (80, 60)
+  rgba = np.zeros((60, 80, 4), dtype=np.uint8)
+  header, img = decode(encoder.encode(rgba))
+  assert header == "data:image/png;base64" and img.mode == "RGBA"
+  header, _ = decode(ImageEncoder().encode(Image.fromarray(rgba), imgformat='jpeg'))
+  assert header == "data:image/jpeg;base64"
+  with pytest.raises(ValueError):
+    encoder.encode(frame(20), imgformat='bmp')
+
+
+def test_encoder_downscales_to_the_window_size():
+  _, img = decode(ImageEncoder(size=(40, None)).encode(frame(10, (200, 100))))
+  assert img.size == (40, 20)
+  _, img = decode(ImageEncoder(size=(None, 50)).encode(frame(10, (200, 100))))
+  assert img.size == (100, 50)
+  _, img = decode(ImageEncoder(size=(400, 400)).encode(frame(10, (200, 100))))
+  assert img.size == (200, 100) # never upscaled
+
+
+def test_encoder_sends_files_as_they_are(tmp_path):
+  path = str(tmp_path / "img.png")
+  Image.fromarray(frame(10, (200, 100))).save(path)
+  encoder = ImageEncoder()
+  dataurl = encoder.encode(path)
+  assert dataurl == "data:image/png;base64," + b64encode(open(path, "rb").read()).decode()
+  assert encoder.encode(path) is None # same file, not modified
+  os.utime(path, (0, 0))
+  assert encoder.encode(path) is not None
+
+  header, img = decode(ImageEncoder(size=(50, None)).encode(path))
+  assert header == "data:image/jpeg;base64" and img.size == (50, 25) # too big: re-encoded
+  header, _ = decode(ImageEncoder().encode(path, imgformat='jpeg'))
+  assert header == "data:image/jpeg;base64"
+
+
+def test_imshow_reuses_the_window_of_the_cell(bridge):
+  for value in (10, 20, 20, 30):
+    imshow(frame(value), windowName="test_reuse")
+  assert sum('id="test_reuse"' in html for html in bridge.html) == 1
+  assert bridge.shown == 3 # the repeated frame is not sent
+
+  bridge.cell += 1 # next cell: the old window is gone
+  imshow(frame(30), windowName="test_reuse")
+  assert sum('id="test_reuse"' in html for html in bridge.html) == 2
+  assert bridge.shown == 4
+
+
+def test_window_is_alive_only_in_its_cell(bridge):
+  window = ImageWindow("test_alive", width=40)
+  assert window.is_alive()
+  bridge.cell += 1
+  assert not window.is_alive()
+
+
+def test_window_stats_and_overlay(bridge):
+  stats = TimingStats()
+  window = ImageWindow("test_stats", stats=stats, overlay=True)
+  assert 'id="test_stats_overlay"' in bridge.html[-1]
+  for value in range(5):
+    window.show(frame(value))
+  window.show(frame(4))
+  assert stats.summary()['display_encode']['count'] == 6
+  assert stats.summary()['display']['count'] == 5
+  assert bridge.shown == 5
@@ -0,0 +1,85 @@
+from os import listdir
+from os.path import isfile
+
+import pytest
+
+from colab_utils import DownloadCache
+
+
+def files(cache):
+  return sorted(f for f in listdir(cache.cache_dir) if f != DownloadCache.MANIFEST)
+
+
+def test_put_get(tmp_path):
+  cache = DownloadCache(str(tmp_path))
+  path = cache.put("http://a/1.jpg", b"abc")
+  assert cache.get("http://a/1.jpg") == path
+  assert open(path, "rb").read() == b"abc"
+  assert cache.get("http://a/2.jpg") is None
+  assert cache.size == 3
+
+
+@pytest.mark.parametrize("hash_content", [False, True])
+def test_put_same_url_twice(tmp_path, hash_content):
+  cache = DownloadCache(str(tmp_path), hash_content=hash_content)
+  cache.put("http://a/1.jpg", b"abc")
+  path = cache.put("http://a/1.jpg", b"abc")
+  assert isfile(path)
+  assert cache.get("http://a/1.jpg") == path
+  assert cache.size == 3
+  assert len(files(cache)) == 1
+
+
+@pytest.mark.parametrize("hash_content", [False, True])
+def test_put_same_url_new_content(tmp_path, hash_content):
+  cache = DownloadCache(str(tmp_path), hash_content=hash_content)
+  cache.put("http://a/1.jpg", b"abc")
+  path = cache.put("http://a/1.jpg", b"abcdef")
+  assert open(cache.get("http://a/1.jpg"), "rb").read() == b"abcdef"
+  assert cache.size == 6
+  assert files(cache) == [path.split("/")[-1]]
+
+
+def test_hash_content_shares_files(tmp_path):
+  cache = DownloadCache(str(tmp_path), hash_content=True)
+  path = cache.put("http://a/1.jpg", b"abc")
+  assert cache.put("http://b/1.jpg", b"abc") == path
+  assert cache.size == 3
+  # the file is only deleted when no URL references it anymore
+  cache.put("http://a/1.jpg", b"xyz")
+  assert isfile(path)
+  cache.put("http://b/1.jpg", b"xyz")
+  assert not isfile(path)
+  assert cache.size == 3 and len(files(cache)) == 1
+
+
+def test_manifest_resumes(tmp_path):
+  cache = DownloadCache(str(tmp_path))
+  path = cache.put("http://a/1.jpg", b"abc")
+  cache.save()
+  cache = DownloadCache(str(tmp_path))
+  assert cache.get("http://a/1.jpg") == path
+  assert cache.size == 3
+
+
+def test_missing_file_is_a_miss(tmp_path):
+  cache = DownloadCache(str(tmp_path))
+  path = cache.put("http://a/1.jpg", b"abc")
+  cache.save()
+  cache = DownloadCache(str(tmp_path))
+  (tmp_path / path.split("/")[-1]).unlink()
+  assert cache.get("http://a/1.jpg") is None
+  assert cache.size == 0
+
+
+def test_evicts_least_recently_used(tmp_path):
+  cache = DownloadCache(str(tmp_path))
+  for i in range(3):
+    cache.put(f"http://a/{i}.jpg", b"x"*10)
+  cache.save()
+  cache = DownloadCache(str(tmp_path), max_size=25)
+  cache.get("http://a/0.jpg") # used by this run, so it's never evicted
+  cache.put("http://a/3.jpg", b"x"*10)
+  assert cache.get("http://a/1.jpg") is None and cache.get("http://a/2.jpg") is None
+  assert cache.get("http://a/0.jpg") is not None and cache.get("http://a/3.jpg") is not None
+  assert cache.size == 20 and len(files(cache)) == 2
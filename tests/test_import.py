@@ -0,0 +1,27 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('PIL', 'requests', 'scipy', 'ffmpeg', 'IPython', 'google.colab')
+
+
+def loaded_modules(statement):
+  """HEAVY_MODULES imported by statement in a fresh interpreter"""
+  script = f"import json, sys; sys.path.insert(0, {ROOT!r}); {statement}; " \
+           f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+  out = subprocess.run([sys.executable, "-I", "-c", script], capture_output=True, text=True, check=True)
+  return json.loads(out.stdout)
+
+
+@pytest.mark.parametrize("statement", ["import colab_utils", "from colab_utils import splitdataset",
+                                       "from colab_utils import Dataset, TimingStats, set_bridge"])
+def test_import_is_lazy(statement):
+  assert loaded_modules(statement) == []
+
+
+def test_names_import_their_submodule():
+  assert loaded_modules("from colab_utils import imshow") == ['PIL']
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "benchmarks"))
+from fake_bridge import FakeBridge
+
+from colab_utils import set_bridge, videoGrabber, run_pipeline, ImageWindow
+
+
+@pytest.fixture
+def bridge():
+  bridge = FakeBridge(latency=0)
+  previous = set_bridge(bridge)
+  yield bridge
+  set_bridge(previous)
+
+
+def grabber(**kwargs):
+  return videoGrabber(size=(64, 48), showVideo=False, fps=200, **kwargs)
+
+
+def run(coro, timeout=10):
+  return asyncio.run(asyncio.wait_for(coro, timeout))
+
+
+def test_max_frames(bridge):
+  vid = grabber()
+  calls = []
+  def model(img):
+    calls.append(img)
+    return np.asarray(img)
+  assert run(run_pipeline(vid, model, "test_pipeline", max_frames=10)) == 10
+  assert len(calls) == 10
+  assert bridge.shown == 10
+  vid.stop()
+
+
+def test_outputs_none_and_coroutine_model(bridge):
+  vid = grabber()
+  async def model(img):
+    return None
+  assert run(run_pipeline(vid, model, ImageWindow("test_none"), max_frames=5)) == 5
+  assert bridge.shown == 0
+  assert run(run_pipeline(vid, lambda img: img, None, max_frames=3)) == 3 # no window
+  assert bridge.shown == 0
+  vid.stop()
+
+
+def test_stop_from_another_task(bridge):
+  vid = grabber()
+  async def main():
+    pipeline = asyncio.ensure_future(run_pipeline(vid, np.asarray, "test_stop", timeout=100))
+    await asyncio.sleep(0.2)
+    await vid.astop()
+    return await pipeline
+  assert run(main()) > 0
+  assert not vid.streaming
+
+
+def test_stop_inside_the_model(bridge):
+  vid = grabber()
+  seen = []
+  async def model(img):
+    seen.append(img)
+    if len(seen) == 5:
+      await vid.astop()
+  assert run(run_pipeline(vid, model, timeout=100)) >= 5
+
+
+def test_model_errors_are_raised(bridge):
+  vid = grabber()
+  def model(img):
+    if model.calls == 3:
+      raise ValueError("broken model")
+    model.calls += 1
+    return img
+  model.calls = 0
+  with pytest.raises(ValueError, match="broken model"):
+    run(run_pipeline(vid, model, "test_error", timeout=100))
+  vid.stop()
+
+
+def test_display_is_not_held_by_the_capture(bridge):
+  # a static scene: after the first frame the reads wait for their whole timeout
+  bridge.scene_every = 10**6
+  vid = grabber(change_threshold=4, keepalive=None)
+  async def main():
+    start = perf_counter()
+    pipeline = asyncio.ensure_future(run_pipeline(vid, np.asarray, "test_wait", timeout=1000))
+    while bridge.shown == 0:
+      await asyncio.sleep(0.005)
+    shown = perf_counter() - start
+    await vid.astop()
+    await pipeline
+    return shown
+  assert run(main()) < 0.5
+
+
+def test_aframes_and_ashow(bridge):
+  vid = grabber()
+  window = ImageWindow("test_aframes")
+  async def main():
+    count = 0
+    async for img, timestamp in vid.aframes(n=2, timeout=100):
+      await window.ashow(img)
+      count += 1
+      if count == 6:
+        await vid.astop()
+    return count
+  assert run(main()) == 6
+  assert bridge.shown == 6
@@ -0,0 +1,82 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from colab_utils import Dataset, splitdataset
+
+
+def make_dataset(n_images, labels_of_image, boxes_per_image=2):
+  paths, labels = [], []
+  for i in range(n_images):
+    for b in range(boxes_per_image):
+      paths.append(f"img_{i}.jpg")
+      labels.append(labels_of_image(i, b))
+  return Dataset(paths, labels, np.tile([0.1, 0.1, 0.5, 0.5], (len(paths), 1)))
+
+
+def image_sets(ds):
+  sets = {}
+  for path, s in zip(ds.paths.tolist(), ds.sets.tolist()):
+    sets.setdefault(path, set()).add(ds.set_names[s])
+  return sets
+
+
+@pytest.mark.parametrize("stratify", [False, True])
+def test_images_stay_in_one_set(stratify):
+  rnd = np.random.RandomState(0)
+  ds = make_dataset(200, lambda i, b: rnd.choice(["cat", "dog", "bird"]))
+  sets = image_sets(splitdataset(ds, stratify=stratify))
+  assert all(len(s) == 1 for s in sets.values())
+  counts = Counter(s.pop() for s in sets.values())
+  assert abs(counts["TRAIN"] - 160) <= 3
+  assert abs(counts["VALIDATION"] - 20) <= 3
+  assert abs(counts["TEST"] - 20) <= 3
+
+
+def test_uniform_split_is_seeded():
+  ds = make_dataset(50, lambda i, b: "cat")
+  assert np.array_equal(splitdataset(ds, seed=1).sets, splitdataset(ds, seed=1).sets)
+  assert not np.array_equal(splitdataset(ds, seed=1).sets, splitdataset(ds, seed=2).sets)
+
+
+@pytest.mark.parametrize("n_rare, expected", [(3, [1, 1, 1]), (5, [3, 1, 1])])
+def test_stratified_split_rare_labels(n_rare, expected):
+  ds = make_dataset(400, lambda i, b: "rare" if i < n_rare and b == 0 else "common")
+  distribution = splitdataset(ds, stratify=True).distribution()
+  assert [distribution[s].get("rare", 0) for s in ("TRAIN", "VALIDATION", "TEST")] == expected
+
+
+def test_stratified_split_balances_every_label():
+  rnd = np.random.RandomState(0)
+  names = ["a", "b", "c", "d"]
+  p = [0.55, 0.3, 0.1, 0.05]
+  ds = make_dataset(500, lambda i, b: rnd.choice(names, p=p), boxes_per_image=3)
+  distribution = splitdataset(ds, stratify=True).distribution()
+  totals = Counter(ds.label_names[l] for l in ds.labels.tolist())
+  for s, ratio in zip(("TRAIN", "VALIDATION", "TEST"), (0.8, 0.1, 0.1)):
+    for label in names:
+      assert abs(distribution[s].get(label, 0) - ratio*totals[label]) <= max(3, 0.1*ratio*totals[label])
+
+
+def test_csv_file(tmp_path):
+  csvfilename = tmp_path / "dataset.csv"
+  rows = [f"UNASSIGNED,img_{i//2}.jpg,{'cat' if i % 2 else 'dog'},0.1,0.1,,,0.5,0.5,,\n" for i in range(40)]
+  csvfilename.write_text("".join(rows))
+  newcsvfilename = str(tmp_path / "split.csv")
+  distribution = splitdataset(str(csvfilename), newcsvfilename=newcsvfilename, stratify=True)
+
+  ds = Dataset.load(newcsvfilename)
+  assert ds.paths.tolist() == [r.split(",")[1] for r in rows] # same rows, same order
+  assert distribution == ds.distribution()
+  assert sum(sum(counts.values()) for counts in distribution.values()) == 40
+  assert csvfilename.read_text() == "".join(rows) # the input file is left alone
+
+
+def test_csv_file_with_short_lines(tmp_path):
+  csvfilename = tmp_path / "dataset.csv"
+  rows = [f"UNASSIGNED,img_{i}.jpg,cat,0.1,0.1,,,0.5,0.5,,\n" for i in range(10)]
+  csvfilename.write_text("".join(rows[:5]) + "\n" + "TRAIN,img_x.jpg\n" + "".join(rows[5:]))
+  distribution = splitdataset(str(csvfilename))
+  assert sum(counts.get("cat", 0) for counts in distribution.values()) == 10
+  assert len(Dataset.load(str(csvfilename))) == 10
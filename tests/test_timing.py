@@ -0,0 +1,84 @@
+import pytest
+
+import colab_utils.timing
+from colab_utils import TimingStats
+
+
+@pytest.fixture
+def clock(monkeypatch):
+  """Fake perf_counter: tests set clock.now"""
+  class Clock:
+    now = 0.0
+  clock = Clock()
+  monkeypatch.setattr(colab_utils.timing, "perf_counter", lambda: clock.now)
+  return clock
+
+
+def test_ring_keeps_the_last_window_values():
+  stats = TimingStats(window=5)
+  for i in range(12):
+    stats.record('decode', i/1000)
+  values = stats.values('decode')
+  assert len(values) == 5
+  assert sorted(values*1000) == pytest.approx([7, 8, 9, 10, 11])
+  assert stats.summary()['decode']['count'] == 12 # all the frames, not only the window
+
+
+def test_fps(clock):
+  stats = TimingStats(window=10)
+  assert stats.fps() == 0.0
+  clock.now = 1.0
+  stats.record('decode', 0.001)
+  assert stats.fps() == 0.0 # one frame is not a rate
+  for i in range(1, 30):
+    clock.now = 1.0 + i/20
+    stats.record('decode', 0.001)
+  assert stats.fps() == pytest.approx(20) # last 10 frames, 50 ms apart
+  assert stats.fps('decode') == stats.fps()
+  assert stats.fps('inference') == 0.0
+
+  for i in range(5):
+    clock.now = 10.0 + i/10
+    stats.record('display', 0.002)
+  assert stats.fps() == pytest.approx(10) # display is the last stage of the loop
+
+
+def test_timer(clock):
+  stats = TimingStats()
+  clock.now = 2.0
+  with stats.timer('inference'):
+    clock.now = 2.25
+  with pytest.raises(ValueError):
+    with stats.timer('inference'):
+      clock.now = 2.5
+      raise ValueError()
+  assert stats.values('inference') == pytest.approx([0.25, 0.25])
+
+
+def test_summary_and_overlay(clock):
+  stats = TimingStats()
+  for i in range(1, 101):
+    clock.now = i/25
+    stats.record('decode', i/1000)
+    stats.record('display', 0.010)
+  summary = stats.summary()
+  assert stats.stages() == ['decode', 'display']
+  assert summary['decode']['count'] == 100
+  assert summary['decode']['mean_ms'] == pytest.approx(50.5)
+  assert summary['decode']['p50_ms'] == pytest.approx(50.5)
+  assert summary['decode']['p90_ms'] == pytest.approx(90.1)
+  assert summary['decode']['max_ms'] == pytest.approx(100)
+  assert summary['display']['p99_ms'] == pytest.approx(10)
+  assert stats.overlay_text() == "25.0 FPS | decode 50.5 | display 10.0 ms"
+  assert str(stats).splitlines()[0] == "25.0 FPS"
+  counts, edges = stats.histogram('decode', bins=10)
+  assert counts.sum() == 100 and edges[0] == pytest.approx(1) and edges[-1] == pytest.approx(100)
+
+
+def test_reset():
+  stats = TimingStats()
+  stats.record('decode', 0.001)
+  stats.reset()
+  assert stats.stages() == [] and stats.summary() == {} and stats.fps() == 0.0
+  stats.record('decode', 0.002)
+  assert stats.values('decode') == pytest.approx([0.002])